@@ -1 +1,5 @@
- 
\ No newline at end of file
+def run_app(*args, **kwargs):
+    # Imported on call so that importing offline_gpt (e.g. the database or
+    # backend modules) does not pull in PySide6
+    from .ui.main_window import run_app as _run_app
+    return _run_app(*args, **kwargs)
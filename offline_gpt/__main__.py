@@ -1,4 +1,28 @@
-from .ui.main_window import run_app
+import time
+
+# Used for the startup trace where the OS cannot say when the process was created
+_PROCESS_START = time.perf_counter()
+
+import multiprocessing
+import sys
+
+from offline_gpt.startup import StartupTrace, process_start
+
+
+def main():
+    # Needed for the inference worker process in PyInstaller builds
+    multiprocessing.freeze_support()
+    enabled = "--trace-startup" in sys.argv[1:]
+    # Measured from process creation, so interpreter startup and the one-file
+    # unpack are included
+    start, origin = process_start(_PROCESS_START) if enabled else (_PROCESS_START, "interpreter start")
+    trace = StartupTrace(enabled=enabled, start=start, origin=origin)
+    trace.mark("interpreter ready")
+    # Import the UI only now so the trace covers PySide6 and the window module
+    from offline_gpt.ui.main_window import run_app
+    trace.mark("ui modules imported")
+    run_app(trace=trace, diagnostics="--diagnostics" in sys.argv[1:])
+
 
 if __name__ == "__main__":
-    run_app() 
\ No newline at end of file
+    main()
@@ -0,0 +1,147 @@
+import logging
+import random
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger("offline-gpt")
+
+def common_prefix_length(sequences: Sequence[Sequence[int]]) -> int:
+    """Length of the token prefix shared by every sequence"""
+    if not sequences:
+        return 0
+    length = min(len(s) for s in sequences)
+    first = sequences[0]
+    for i in range(length):
+        token = first[i]
+        if any(s[i] != token for s in sequences[1:]):
+            return i
+    return length
+
+class BatchedGenerator:
+    """Decodes several prompts together using llama.cpp's multi-sequence batch API.
+
+    Each prompt gets its own sequence id (and so its own KV cells) in the
+    model's context. The token prefix common to all prompts is evaluated once
+    and copied to the other sequences, then every step decodes one token for
+    each unfinished sequence in a single forward pass.
+
+    The generator takes over the model's KV cache; it is cleared again when
+    generation finishes, so callers must hold the backend lock.
+    """
+
+    def __init__(self, model, top_k: int = 40, seed: Optional[int] = None):
+        self.model = model
+        self.top_k = top_k
+        self.rng = random.Random(seed)
+
+    def generate(self, prompts: List[str], max_tokens: int = 256, temperature: float = 0.7, stop: Optional[List[str]] = None) -> List[str]:
+        import llama_cpp
+        model = self.model
+        ctx = model.ctx
+        stop = stop or []
+        n_seq = len(prompts)
+        if n_seq == 0:
+            return []
+        # Every step decodes one token per sequence in a single llama_decode,
+        # which asserts on more tokens than the context's n_batch
+        if n_seq > model.n_batch:
+            raise ValueError(f"{n_seq} prompts do not fit in a batch of {model.n_batch} tokens")
+        token_lists = [model.tokenize(p.encode("utf-8"), add_bos=True, special=True) for p in prompts]
+        # Keep at least one token per sequence out of the shared prefix so each
+        # sequence gets its own logits from the prompt pass
+        prefix_len = min(common_prefix_length(token_lists), min(len(t) for t in token_lists) - 1)
+        prompt_cells = prefix_len + sum(len(t) - prefix_len for t in token_lists)
+        free_cells = model.n_ctx() - prompt_cells
+        if free_cells < n_seq:
+            raise ValueError(f"{n_seq} prompts of {prompt_cells} tokens do not fit in a context of {model.n_ctx()}")
+        max_tokens = min(max_tokens, free_cells // n_seq)
+
+        stop_tokens = {model.token_eos()}
+        for text in stop:
+            tokens = model.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+            if len(tokens) == 1:
+                stop_tokens.add(tokens[0])
+
+        n_batch = model.n_batch
+        batch = llama_cpp.llama_batch_init(n_batch, 0, n_seq)
+        outputs: List[List[int]] = [[] for _ in range(n_seq)]
+        texts = ["" for _ in range(n_seq)]
+        try:
+            llama_cpp.llama_kv_cache_clear(ctx)
+            # Shared prefix once on sequence 0, then copied to the others
+            prefix = [(token, pos, 0, False) for pos, token in enumerate(token_lists[0][:prefix_len])]
+            self._decode(batch, n_batch, prefix, {})
+            for seq in range(1, n_seq):
+                llama_cpp.llama_kv_cache_seq_cp(ctx, 0, seq, 0, prefix_len)
+
+            # Remaining prompt tokens of every sequence, logits only for the last one
+            entries = []
+            for seq, tokens in enumerate(token_lists):
+                for pos in range(prefix_len, len(tokens)):
+                    entries.append((tokens[pos], pos, seq, pos == len(tokens) - 1))
+            next_tokens = {}
+            self._decode(batch, n_batch, entries, next_tokens, temperature)
+
+            positions = [len(tokens) for tokens in token_lists]
+            active = set(range(n_seq))
+            for step in range(max_tokens):
+                for seq in sorted(active):
+                    token = next_tokens[seq]
+                    if token in stop_tokens:
+                        active.discard(seq)
+                        continue
+                    outputs[seq].append(token)
+                    texts[seq] = model.detokenize(outputs[seq]).decode("utf-8", errors="ignore")
+                    cut = min((texts[seq].find(s) for s in stop if s in texts[seq]), default=-1)
+                    if cut >= 0:
+                        texts[seq] = texts[seq][:cut]
+                        active.discard(seq)
+                if not active or step == max_tokens - 1:
+                    break
+                entries = [(next_tokens[seq], positions[seq], seq, True) for seq in sorted(active)]
+                for seq in active:
+                    positions[seq] += 1
+                next_tokens = {}
+                self._decode(batch, n_batch, entries, next_tokens, temperature)
+        finally:
+            llama_cpp.llama_batch_free(batch)
+            llama_cpp.llama_kv_cache_clear(ctx)
+            # The high-level Llama cache bookkeeping no longer matches the KV cache
+            model.reset()
+        logger.info(f"Batched generation finished for {n_seq} sequences (shared prefix {prefix_len} tokens)")
+        return texts
+
+    def _decode(self, batch, n_batch: int, entries, next_tokens, temperature: float = 0.0):
+        """Decode (token, pos, seq_id, want_logits) entries in chunks of n_batch,
+        sampling the next token of every sequence whose logits were requested"""
+        import llama_cpp
+        ctx = self.model.ctx
+        for start in range(0, len(entries), n_batch):
+            chunk = entries[start:start + n_batch]
+            for i, (token, pos, seq_id, want_logits) in enumerate(chunk):
+                batch.token[i] = token
+                batch.pos[i] = pos
+                batch.n_seq_id[i] = 1
+                batch.seq_id[i][0] = seq_id
+                batch.logits[i] = want_logits
+            batch.n_tokens = len(chunk)
+            if llama_cpp.llama_decode(ctx, batch) != 0:
+                raise RuntimeError("llama_decode failed during batched generation")
+            for i, (_token, _pos, seq_id, want_logits) in enumerate(chunk):
+                if want_logits:
+                    next_tokens[seq_id] = self._sample(llama_cpp.llama_get_logits_ith(ctx, i), temperature)
+
+    def _sample(self, logits_ptr, temperature: float) -> int:
+        import numpy as np
+        logits = np.ctypeslib.as_array(logits_ptr, shape=(self.model.n_vocab(),))
+        return sample_token(logits, temperature, self.top_k, self.rng)
+
+def sample_token(logits, temperature: float, top_k: int, rng: random.Random) -> int:
+    """Top-k temperature sampling over a numpy logits vector; greedy when temperature <= 0"""
+    import numpy as np
+    if temperature <= 0:
+        return int(np.argmax(logits))
+    top_k = min(top_k, len(logits))
+    candidates = np.argpartition(logits, -top_k)[-top_k:]
+    scaled = logits[candidates].astype(np.float64) / temperature
+    weights = np.exp(scaled - scaled.max())
+    return int(rng.choices(candidates.tolist(), weights=weights.tolist())[0])
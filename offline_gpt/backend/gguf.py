@@ -0,0 +1,125 @@
+import logging
+import struct
+from typing import Any, BinaryIO, Dict, Optional
+
+logger = logging.getLogger("offline-gpt")
+
+GGUF_MAGIC = b"GGUF"
+
+# Context used when the model's trained length cannot be read
+DEFAULT_N_CTX = 2048
+
+# KV cache element types: GGML type id and bytes per element (the quantized
+# types store blocks of 32 values plus an f16 scale)
+KV_CACHE_TYPES = {
+    "f32": (0, 4.0),
+    "f16": (1, 2.0),
+    "q8_0": (8, 34 / 32),
+    "q4_0": (2, 18 / 32),
+}
+
+# GGUF value types with a fixed size, as struct format codes
+_SCALAR_FORMATS = {0: "B", 1: "b", 2: "H", 3: "h", 4: "I", 5: "i", 6: "f", 7: "?", 10: "Q", 11: "q", 12: "d"}
+_STRING = 8
+_ARRAY = 9
+
+def _read(f: BinaryIO, fmt: str):
+    size = struct.calcsize("<" + fmt)
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated GGUF header")
+    return struct.unpack("<" + fmt, data)[0]
+
+def _read_string(f: BinaryIO) -> str:
+    length = _read(f, "Q")
+    return f.read(length).decode("utf-8", errors="replace")
+
+def _skip_value(f: BinaryIO, value_type: int):
+    if value_type == _STRING:
+        f.seek(_read(f, "Q"), 1)
+    elif value_type == _ARRAY:
+        item_type = _read(f, "I")
+        count = _read(f, "Q")
+        if item_type in _SCALAR_FORMATS:
+            f.seek(count * struct.calcsize(_SCALAR_FORMATS[item_type]), 1)
+        else:
+            for _ in range(count):
+                _skip_value(f, item_type)
+    elif value_type in _SCALAR_FORMATS:
+        f.seek(struct.calcsize(_SCALAR_FORMATS[value_type]), 1)
+    else:
+        raise ValueError(f"Unknown GGUF value type {value_type}")
+
+def read_gguf_metadata(path: str) -> Dict[str, Any]:
+    """Read the scalar and string key/values from a GGUF file header.
+
+    Arrays (such as the tokenizer vocabulary) are skipped without being
+    loaded. Raises ValueError if the file is not GGUF (version 2 or later).
+    """
+    metadata: Dict[str, Any] = {}
+    with open(path, "rb") as f:
+        if f.read(4) != GGUF_MAGIC:
+            raise ValueError(f"Not a GGUF file: {path}")
+        version = _read(f, "I")
+        if version < 2:
+            raise ValueError(f"Unsupported GGUF version {version}")
+        _tensor_count = _read(f, "Q")
+        kv_count = _read(f, "Q")
+        for _ in range(kv_count):
+            key = _read_string(f)
+            value_type = _read(f, "I")
+            if value_type == _STRING:
+                metadata[key] = _read_string(f)
+            elif value_type in _SCALAR_FORMATS:
+                metadata[key] = _read(f, _SCALAR_FORMATS[value_type])
+            else:
+                _skip_value(f, value_type)
+    return metadata
+
+def _arch_value(metadata: Dict[str, Any], name: str) -> Optional[Any]:
+    return metadata.get(f"{metadata.get('general.architecture', 'llama')}.{name}")
+
+def kv_cache_bytes(metadata: Dict[str, Any], n_ctx: int, kv_cache_type: str = "f16") -> Optional[int]:
+    """Estimated KV cache size for ``n_ctx`` tokens, or None if the metadata lacks the model dimensions"""
+    n_layer = _arch_value(metadata, "block_count")
+    n_embd = _arch_value(metadata, "embedding_length")
+    n_head = _arch_value(metadata, "attention.head_count")
+    if not (n_layer and n_embd and n_head):
+        return None
+    n_head_kv = _arch_value(metadata, "attention.head_count_kv") or n_head
+    # K and V each hold one vector per layer per token, shrunk by grouped-query attention
+    n_embd_kv = n_embd // n_head * n_head_kv
+    return int(2 * n_ctx * n_layer * n_embd_kv * KV_CACHE_TYPES[kv_cache_type][1])
+
+def context_plan(model_path: str, context_length: Optional[int] = None, kv_cache_type: str = "f16") -> Dict[str, Any]:
+    """Resolve the context size to load ``model_path`` with and estimate its KV cache.
+
+    ``context_length`` of None means the model's trained maximum; larger
+    values are clamped to it. Returns a dict with ``n_ctx``, ``max_ctx``,
+    ``kv_cache_type`` and ``kv_bytes``; ``max_ctx`` and ``kv_bytes`` are None
+    when the header cannot be read.
+    """
+    if kv_cache_type not in KV_CACHE_TYPES:
+        raise ValueError(f"Unknown KV cache type {kv_cache_type!r}; expected one of {', '.join(KV_CACHE_TYPES)}")
+    try:
+        metadata = read_gguf_metadata(model_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read GGUF metadata from {model_path}: {e}")
+        metadata = {}
+    max_ctx = _arch_value(metadata, "context_length")
+    n_ctx = context_length or max_ctx or DEFAULT_N_CTX
+    if max_ctx and n_ctx > max_ctx:
+        logger.warning(f"Requested context of {n_ctx} tokens exceeds the model's {max_ctx}; using {max_ctx}")
+        n_ctx = max_ctx
+    return {
+        "n_ctx": n_ctx,
+        "max_ctx": max_ctx,
+        "kv_cache_type": kv_cache_type,
+        "kv_bytes": kv_cache_bytes(metadata, n_ctx, kv_cache_type),
+    }
+
+def describe_plan(plan: Dict[str, Any]) -> str:
+    text = f"{plan['n_ctx']}-token context, {plan['kv_cache_type']} KV cache"
+    if plan["kv_bytes"] is not None:
+        text += f" (~{plan['kv_bytes'] / (1024 * 1024):.0f} MB)"
+    return text
@@ -1,29 +1,67 @@
-from llama_cpp import Llama
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Optional
 import logging
 
+from offline_gpt.backend.gguf import KV_CACHE_TYPES, context_plan, describe_plan
+
 logger = logging.getLogger("offline-gpt")
 
+# Number of past messages kept as context when no conversation is passed in
+HISTORY_CONTEXT_MESSAGES = 10
+
+STOP_SEQUENCES = ["<|end|>", "<|user|>"]
+
 class LLMBackend:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, model=None, context_length: Optional[int] = None, kv_cache_type: str = "f16"):
         self.model_path = model_path
-        self.model = None
-        self._load_model()
-        # Store conversation history for context
+        # None loads the model's full trained context (read from the GGUF header)
+        self.context_length = context_length
+        self.kv_cache_type = kv_cache_type
+        self.n_ctx = context_length
+        # An already constructed model (e.g. a test stand-in) skips loading
+        self.model = model
+        # Serialises access to the model and its KV cache across threads
+        self._lock = threading.Lock()
+        # Set while a generation waits for the lock so prefill yields to it
+        self._generation_waiting = threading.Event()
+        # Seconds the most recent reload after unload() took
+        self.last_reload_seconds: Optional[float] = None
+        if self.model is None:
+            self._load_model()
+        # Fallback context for callers that do not pass a conversation; bounded
+        # to the messages actually used in prompts
         self.conversation_history: List[Dict[str, str]] = []
+        # Evaluate the system prompt once up front; every later prompt starts
+        # with it, so llama.cpp's prefix matching keeps reusing those KV cells
+        self.prefill([])
 
     def _load_model(self):
         if not os.path.exists(self.model_path):
             raise FileNotFoundError(f"Model file not found: {self.model_path}")
+        plan = context_plan(self.model_path, self.context_length, self.kv_cache_type)
+        self.n_ctx = plan["n_ctx"]
+        cache_args = {}
+        if self.kv_cache_type != "f16":
+            type_id, bytes_per_element = KV_CACHE_TYPES[self.kv_cache_type]
+            cache_args.update(type_k=type_id, type_v=type_id)
+            if bytes_per_element < 2:
+                # llama.cpp only supports a quantized V cache with flash attention
+                cache_args["flash_attn"] = True
         try:
-            logger.info(f"Loading GGUF model from: {self.model_path}")
+            # llama_cpp is imported here rather than at module level so the UI
+            # can paint its first frame before the native library is loaded
+            from llama_cpp import Llama
+            logger.info(f"Loading GGUF model from: {self.model_path} with {describe_plan(plan)}")
             for handler in logger.handlers:
                 handler.flush()
             self.model = Llama(
                 model_path=self.model_path,
-                n_ctx=2048,
-                verbose=False
+                n_ctx=self.n_ctx,
+                verbose=False,
+                **cache_args
             )
             logger.info("GGUF model loaded successfully")
             for handler in logger.handlers:
@@ -34,31 +72,71 @@ class LLMBackend:
                 handler.flush()
             raise RuntimeError(f"Failed to load LLM model: {e}")
 
-    def chat(self, prompt: str, system_prompt: str = "You are a helpful assistant.", conversation: Optional[List[Dict[str, str]]] = None):
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def unload(self):
+        """Release the model and its KV cache, e.g. after a long idle period.
+
+        The weights are memory-mapped, so a later reload mostly comes back
+        from the OS page cache rather than disk. Waits for any running
+        generation or prefill batch to finish first.
+        """
+        with self._lock:
+            if self.model is None:
+                return
+            close = getattr(self.model, "close", None)
+            if close:
+                close()
+            self.model = None
+        logger.info("LLM model unloaded")
+
+    def ensure_loaded(self) -> Optional[float]:
+        """Reload the model if unload() released it. Returns the reload time in
+        seconds, or None if the model was already loaded."""
+        with self._lock:
+            if self.model is not None:
+                return None
+            start = time.perf_counter()
+            self._load_model()
+            self.last_reload_seconds = time.perf_counter() - start
+        logger.info(f"LLM model reloaded in {self.last_reload_seconds:.2f}s")
+        return self.last_reload_seconds
+
+    def chat(self, prompt: str, system_prompt: str = "You are a helpful assistant.", conversation: Optional[List[Dict[str, str]]] = None, on_token: Optional[Callable[[str], None]] = None):
         logger.info(f"Calling LLM with prompt: {prompt}")
         for handler in logger.handlers:
             handler.flush()
-        if not self.model:
-            raise RuntimeError("Model not loaded.")
         try:
+            self.ensure_loaded()
             # Build conversation context
             if conversation is not None:
                 messages = [{"role": "system", "content": system_prompt}] + conversation
             else:
                 messages = [{"role": "system", "content": system_prompt}]
-                messages.extend(self.conversation_history[-10:])
+                messages.extend(self.conversation_history[-HISTORY_CONTEXT_MESSAGES:])
                 messages.append({"role": "user", "content": prompt})
             formatted_prompt = self._format_messages(messages)
             logger.info(f"Formatted prompt sent to model: {formatted_prompt}")
             for handler in logger.handlers:
                 handler.flush()
-            response = self.model(
-                formatted_prompt,
+            completion_args = dict(
                 max_tokens=256,
                 temperature=0.7,
-                stop=["<|end|>", "<|user|>"],
-                stream=False
+                stop=STOP_SEQUENCES
             )
+            with self._generating():
+                if on_token is None:
+                    response = self.model(formatted_prompt, stream=False, **completion_args)
+                else:
+                    # Forward text as it is generated, then assemble the non-streamed response shape
+                    pieces = []
+                    for chunk in self.model(formatted_prompt, stream=True, **completion_args):
+                        text = chunk['choices'][0]['text']
+                        pieces.append(text)
+                        on_token(text)
+                    response = {'choices': [{'text': ''.join(pieces)}]}
             logger.info(f"Model raw response: {response}")
             for handler in logger.handlers:
                 handler.flush()
@@ -71,10 +149,12 @@ class LLMBackend:
                 first_response = generated_text
             else:
                 first_response = "[Invalid response format]"
-            self.conversation_history.extend([
-                {"role": "user", "content": prompt},
-                {"role": "assistant", "content": first_response}
-            ])
+            if conversation is None:
+                self.conversation_history.extend([
+                    {"role": "user", "content": prompt},
+                    {"role": "assistant", "content": first_response}
+                ])
+                del self.conversation_history[:-HISTORY_CONTEXT_MESSAGES]
             logger.info(f"Extracted LLM response: {first_response}")
             for handler in logger.handlers:
                 handler.flush()
@@ -85,6 +165,81 @@ class LLMBackend:
                 handler.flush()
             return f"[LLM error: {e}]"
 
+    def chat_batch(self, conversations: List[List[Dict[str, str]]], system_prompt: str = "You are a helpful assistant.") -> List[str]:
+        """Generate a reply for each conversation in one batched decode"""
+        prompts = [self._format_messages([{"role": "system", "content": system_prompt}] + conversation) for conversation in conversations]
+        logger.info(f"Batched LLM call for {len(prompts)} sequences")
+        try:
+            self.ensure_loaded()
+            from offline_gpt.backend.batch import BatchedGenerator
+            with self._generating():
+                texts = BatchedGenerator(self.model).generate(prompts, max_tokens=256, temperature=0.7, stop=STOP_SEQUENCES)
+        except Exception as e:
+            logger.error(f"LLM batch error: {e}")
+            return [f"[LLM error: {e}]"] * len(prompts)
+        finally:
+            # Batching cleared the KV cache; put the system prompt back
+            self.prefill([], system_prompt=system_prompt)
+        responses = []
+        for text in texts:
+            text = text.strip()
+            if text.startswith('<|assistant|>'):
+                text = text.replace('<|assistant|>', '').strip()
+            responses.append(text)
+        return responses
+
+    def chat_n(self, conversation: List[Dict[str, str]], n: int, system_prompt: str = "You are a helpful assistant.") -> List[str]:
+        """Generate n alternative replies; the whole prompt is evaluated once and shared"""
+        return self.chat_batch([conversation] * n, system_prompt=system_prompt)
+
+    def prefill(self, conversation: List[Dict[str, str]], draft: Optional[str] = None, system_prompt: str = "You are a helpful assistant.", should_stop: Optional[Callable[[], bool]] = None) -> int:
+        """Evaluate the prompt for ``conversation`` (plus ``draft`` as the pending
+        user message) into the KV cache ahead of a chat() call.
+
+        Only tokens beyond the prefix already in the cache are evaluated, one
+        batch at a time; it stops early when a generation is waiting for the
+        model or ``should_stop`` returns True. Returns the number of tokens
+        evaluated.
+        """
+        if not self.model:
+            return 0
+        messages = [{"role": "system", "content": system_prompt}] + conversation
+        if draft:
+            messages.append({"role": "user", "content": draft})
+        from offline_gpt.backend.batch import common_prefix_length
+        evaluated = 0
+        try:
+            tokens = self.model.tokenize(self._format_messages(messages).encode("utf-8"), add_bos=True, special=True)
+            # Generation always evaluates the final prompt token itself
+            tokens = tokens[:-1]
+            while True:
+                if self._generation_waiting.is_set() or (should_stop and should_stop()):
+                    break
+                with self._lock:
+                    if self.model is None:
+                        # Unloaded meanwhile
+                        break
+                    cached = common_prefix_length([list(self.model._input_ids), tokens])
+                    if cached >= len(tokens):
+                        break
+                    chunk = tokens[cached:cached + self.model.n_batch]
+                    self.model.n_tokens = cached
+                    self.model.eval(chunk)
+                    evaluated += len(chunk)
+        except Exception as e:
+            logger.warning(f"Prefill failed: {e}")
+        if evaluated:
+            logger.info(f"Prefilled {evaluated} prompt tokens")
+        return evaluated
+
+    @contextmanager
+    def _generating(self):
+        """Take the model lock for generation, asking a running prefill to yield first"""
+        self._generation_waiting.set()
+        with self._lock:
+            self._generation_waiting.clear()
+            yield
+
     def _format_messages(self, messages: List[Dict[str, str]]) -> str:
         """Format messages for Phi-3 chat template"""
         formatted = ""
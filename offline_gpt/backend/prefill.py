@@ -0,0 +1,50 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("offline-gpt")
+
+class SpeculativePrefiller:
+    """Runs backend.prefill on a background thread while the user types.
+
+    Only the most recent request matters: submitting a new one makes the
+    running prefill stop after its current batch, and the new request then
+    reuses whatever part of the prompt was already evaluated.
+    """
+
+    def __init__(self, backend, system_prompt: str = "You are a helpful assistant."):
+        self.backend = backend
+        self.system_prompt = system_prompt
+        self._cond = threading.Condition()
+        self._request: Optional[Tuple[List[Dict[str, str]], Optional[str]]] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="llm-prefill", daemon=True)
+        self._thread.start()
+
+    def submit(self, conversation: List[Dict[str, str]], draft: Optional[str] = None):
+        with self._cond:
+            self._request = (conversation, draft)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._request = None
+            self._cond.notify()
+
+    def _superseded(self) -> bool:
+        return self._closed or self._request is not None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._request is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                conversation, draft = self._request
+                self._request = None
+            try:
+                self.backend.prefill(conversation, draft, system_prompt=self.system_prompt, should_stop=self._superseded)
+            except Exception as e:
+                logger.warning(f"Speculative prefill failed: {e}")
@@ -0,0 +1,187 @@
+import logging
+import multiprocessing
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from offline_gpt.backend.llm import LLMBackend
+
+logger = logging.getLogger("offline-gpt")
+
+# Messages on the pipe are tuples whose first element is the message type.
+#   parent -> worker: ("chat", prompt, system_prompt, conversation),
+#                     ("chat_batch", conversations, system_prompt),
+#                     ("prefill", conversation, draft, system_prompt), ("shutdown",)
+#   Prefill gets no reply and stops as soon as another request arrives.
+#   worker -> parent: ("ready",), ("error", exception_name, message),
+#                     ("token", text), ("done", response)
+
+def _worker_main(conn, model_path: str, context_length: Optional[int] = None, kv_cache_type: str = "f16"):
+    """Entry point of the inference process: load the model, then serve requests"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s[worker] %(message)s')
+    try:
+        backend = LLMBackend(model_path, context_length=context_length, kv_cache_type=kv_cache_type)
+    except Exception as e:
+        conn.send(("error", type(e).__name__, str(e)))
+        conn.close()
+        return
+    conn.send(("ready",))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            # Parent went away
+            return
+        if request[0] == "shutdown":
+            return
+        if request[0] == "chat":
+            _op, prompt, system_prompt, conversation = request
+            response = backend.chat(
+                prompt,
+                system_prompt=system_prompt,
+                conversation=conversation,
+                on_token=lambda text: conn.send(("token", text))
+            )
+            conn.send(("done", response))
+        elif request[0] == "chat_batch":
+            _op, conversations, system_prompt = request
+            conn.send(("done", backend.chat_batch(conversations, system_prompt=system_prompt)))
+        elif request[0] == "prefill":
+            _op, conversation, draft, system_prompt = request
+            backend.prefill(conversation, draft, system_prompt=system_prompt, should_stop=conn.poll)
+
+class LLMWorkerClient:
+    """Hosts an LLMBackend in a child process, with the same chat() interface.
+
+    Tokens stream back over a pipe as they are generated. If the worker dies
+    (for example a crash or out-of-memory inside llama.cpp) the in-flight
+    request returns an error string and the worker is started again.
+    """
+
+    def __init__(self, model_path: str, context_length: Optional[int] = None, kv_cache_type: str = "f16"):
+        self.model_path = model_path
+        self.context_length = context_length
+        self.kv_cache_type = kv_cache_type
+        # spawn rather than fork: the parent has Qt and its threads running
+        self._context = multiprocessing.get_context("spawn")
+        # One request at a time over the pipe
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._start()
+
+    def _start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, self.model_path, self.context_length, self.kv_cache_type), name="offline-gpt-llm", daemon=True)
+        process.start()
+        child_conn.close()
+        try:
+            message = parent_conn.recv()
+        except EOFError:
+            message = ("error", "RuntimeError", f"LLM worker exited during startup (exit code {process.exitcode})")
+        if message[0] == "error":
+            process.join()
+            parent_conn.close()
+            _name, error_type, error = message
+            if error_type == "FileNotFoundError":
+                raise FileNotFoundError(error)
+            raise RuntimeError(error)
+        self._process, self._conn = process, parent_conn
+        logger.info(f"LLM worker process started (pid {process.pid})")
+
+    def _restart(self):
+        self._stop()
+        try:
+            self._start()
+        except Exception as e:
+            logger.error(f"Failed to restart LLM worker: {e}")
+
+    @property
+    def loaded(self) -> bool:
+        return self._process is not None
+
+    def unload(self):
+        """Stop the worker process, releasing the model; ensure_loaded() starts it again"""
+        with self._lock:
+            if self._process is None:
+                return
+            self._stop()
+        logger.info("LLM worker stopped to release the model")
+
+    def ensure_loaded(self) -> Optional[float]:
+        """Start the worker again after unload(). Returns the reload time in
+        seconds, or None if it was already running."""
+        with self._lock:
+            if self._process is not None:
+                return None
+            start = time.perf_counter()
+            self._start()
+            seconds = time.perf_counter() - start
+        logger.info(f"LLM worker reloaded in {seconds:.2f}s")
+        return seconds
+
+    def chat(self, prompt: str, system_prompt: str = "You are a helpful assistant.", conversation: Optional[List[Dict[str, str]]] = None, on_token: Optional[Callable[[str], None]] = None):
+        return self._request(("chat", prompt, system_prompt, conversation), on_token)
+
+    def chat_batch(self, conversations: List[List[Dict[str, str]]], system_prompt: str = "You are a helpful assistant.") -> List[str]:
+        result = self._request(("chat_batch", conversations, system_prompt))
+        # Worker failures come back as a single error string
+        if isinstance(result, str):
+            return [result] * len(conversations)
+        return result
+
+    def chat_n(self, conversation: List[Dict[str, str]], n: int, system_prompt: str = "You are a helpful assistant.") -> List[str]:
+        return self.chat_batch([conversation] * n, system_prompt=system_prompt)
+
+    def prefill(self, conversation: List[Dict[str, str]], draft: Optional[str] = None, system_prompt: str = "You are a helpful assistant.", should_stop: Optional[Callable[[], bool]] = None):
+        """Ask the worker to prefill; skipped while a request is in flight"""
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            if self._process is not None and self._process.is_alive():
+                self._conn.send(("prefill", conversation, draft, system_prompt))
+        except OSError as e:
+            logger.warning(f"Could not send prefill to LLM worker: {e}")
+        finally:
+            self._lock.release()
+        return 0
+
+    def _request(self, request, on_token: Optional[Callable[[str], None]] = None):
+        """Send one request and wait for its result, forwarding streamed tokens"""
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                logger.warning("LLM worker is not running, restarting it")
+                self._restart()
+                if self._process is None:
+                    return "[LLM error: inference worker could not be started]"
+            try:
+                self._conn.send(request)
+                while True:
+                    message = self._conn.recv()
+                    if message[0] == "token":
+                        if on_token:
+                            on_token(message[1])
+                    elif message[0] == "done":
+                        return message[1]
+            except (EOFError, OSError) as e:
+                logger.error(f"LLM worker died during generation (exit code {self._process.exitcode}): {e}")
+                self._restart()
+                return "[LLM error: inference worker crashed and was restarted]"
+
+    def _stop(self):
+        if self._conn is not None:
+            try:
+                self._conn.send(("shutdown",))
+            except (OSError, ValueError):
+                pass
+            self._conn.close()
+        if self._process is not None:
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+        self._process, self._conn = None, None
+
+    def close(self):
+        with self._lock:
+            self._stop()
@@ -0,0 +1,58 @@
+import time
+from typing import List, Optional
+
+class FakeLlama:
+    """Stand-in for llama_cpp.Llama that returns canned text without a model.
+
+    Only the parts used by LLMBackend are implemented. Each generated "token"
+    is a word of ``reply`` and takes ``seconds_per_token``, so UI latency can
+    be measured separately from inference speed. Prompt tokens are bytes, and
+    ``evaluated`` counts how many were evaluated after prefix reuse, as
+    llama.cpp does.
+    """
+
+    def __init__(self, reply: str = "Here is a **short** answer with `code`.", seconds_per_token: float = 0.0):
+        self.reply = reply
+        self.seconds_per_token = seconds_per_token
+        self.prompts: List[str] = []
+        self.n_batch = 512
+        self.input_ids: List[int] = []
+        self.n_tokens = 0
+        self.evaluated = 0
+
+    @property
+    def _input_ids(self) -> List[int]:
+        return self.input_ids[:self.n_tokens]
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        return ([1] if add_bos else []) + list(text)
+
+    def eval(self, tokens: List[int]):
+        self.input_ids = self.input_ids[:self.n_tokens] + list(tokens)
+        self.n_tokens = len(self.input_ids)
+        self.evaluated += len(tokens)
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def __call__(self, prompt: str, max_tokens: int = 256, temperature: float = 0.7, stop: Optional[List[str]] = None, stream: bool = False):
+        self.prompts.append(prompt)
+        tokens = self.tokenize(prompt.encode("utf-8"), special=True)
+        cached = 0
+        for a, b in zip(self._input_ids, tokens[:-1]):
+            if a != b:
+                break
+            cached += 1
+        self.n_tokens = cached
+        self.eval(tokens[cached:])
+        words = self.reply.split(" ")[:max_tokens]
+        pieces = [word if i == 0 else " " + word for i, word in enumerate(words)]
+        if stream:
+            return self._stream(pieces)
+        time.sleep(self.seconds_per_token * len(pieces))
+        return {'choices': [{'text': "".join(pieces)}]}
+
+    def _stream(self, pieces):
+        for piece in pieces:
+            time.sleep(self.seconds_per_token)
+            yield {'choices': [{'text': piece}]}
@@ -0,0 +1,140 @@
+"""Offscreen benchmark of the chat window against synthetic histories.
+
+Usage:
+    python -m offline_gpt.bench.harness --sizes 10x10,1000x20,5000x50 --output bench.json
+
+Each size is CONVERSATIONSxMESSAGES. For every size a fresh database is
+generated, a ChatWindow is opened on it with a FakeLlama backend, and the
+timings below are collected and emitted as JSON.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from offline_gpt.backend.llm import LLMBackend
+from offline_gpt.bench.fake_llama import FakeLlama
+from offline_gpt.bench.synthetic import generate_history_db
+from offline_gpt.diagnostics import current_rss_bytes
+
+def _rss_mb():
+    rss = current_rss_bytes()
+    return rss / (1024 * 1024) if rss is not None else None
+
+def _wait_until(app, predicate: Callable[[], bool], timeout: float = 30.0) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        app.processEvents()
+        time.sleep(0.001)
+    return True
+
+def _timed(action: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    action()
+    return (time.perf_counter() - start) * 1000
+
+def benchmark_size(app, workdir: str, conversations: int, messages: int, sends: int = 3) -> Dict:
+    from offline_gpt.ui.main_window import ChatBubble, ChatWindow
+
+    db_path = os.path.join(workdir, f"bench_{conversations}x{messages}.db")
+    start = time.perf_counter()
+    history_db = generate_history_db(db_path, conversations, messages)
+    generate_ms = (time.perf_counter() - start) * 1000
+    rss_before = _rss_mb()
+    tracemalloc.start()
+
+    llm = LLMBackend("fake.gguf", model=FakeLlama())
+    start = time.perf_counter()
+    window = ChatWindow(history_db=history_db, llm=llm)
+    window.show()
+    _wait_until(app, lambda: window.current_conversation_id is not None and window._llm_ready.is_set())
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    sidebar_refresh_ms = _timed(window._load_conversations)
+    sidebar_update_ms = _timed(lambda: window._update_conversation_summary("Renamed by the benchmark harness"))
+
+    # Open a conversation that is not cached yet: the last row of the first page
+    row = min(window.convo_model.rowCount(), window.convo_model.page_size) - 1
+    index = window.convo_model.index(row)
+    start = time.perf_counter()
+    window.select_conversation(index)
+    app.processEvents()
+    # Time until the newest bubbles are on screen, then until the view has filled in and rendered
+    open_ms = (time.perf_counter() - start) * 1000
+    _wait_until(app, window.history_loaded)
+    fill_ms = (time.perf_counter() - start) * 1000
+    if window.sidebar_expanded:
+        window.toggle_sidebar()
+
+    send_ms: List[float] = []
+    for i in range(sends):
+        window.input_box.setText(f"Benchmark question {i}")
+        start = time.perf_counter()
+        window.send_message()
+        _wait_until(app, lambda: window.loading_bubble is None)
+        send_ms.append((time.perf_counter() - start) * 1000)
+
+    _current, peak_python = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _rss_mb()
+    bubbles = len(window.chat_container.findChildren(ChatBubble))
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+
+    return {
+        "conversations": conversations,
+        "messages_per_conversation": messages,
+        "db_size_mb": os.path.getsize(db_path) / (1024 * 1024),
+        "generate_db_ms": generate_ms,
+        "startup_to_history_ms": startup_ms,
+        "sidebar_refresh_ms": sidebar_refresh_ms,
+        "sidebar_summary_update_ms": sidebar_update_ms,
+        "conversation_open_ms": open_ms,
+        "conversation_fill_ms": fill_ms,
+        "send_to_display_ms": send_ms,
+        "python_peak_mb": peak_python / (1024 * 1024),
+        "rss_before_mb": rss_before,
+        "rss_after_mb": rss_after,
+        "bubbles_after_sends": bubbles,
+    }
+
+def parse_sizes(text: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for part in text.split(","):
+        conversations, messages = part.lower().split("x")
+        sizes.append((int(conversations), int(messages)))
+    return sizes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10x10,500x20,2000x50", help="comma-separated CONVERSATIONSxMESSAGES")
+    parser.add_argument("--sends", type=int, default=3, help="messages sent per size for send-to-display latency")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for conversations, messages in parse_sizes(args.sizes):
+            results.append(benchmark_size(app, workdir, conversations, messages, args.sends))
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0], "results": results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import random
+import sqlite3
+import time
+import uuid
+from typing import List
+
+from offline_gpt.database.history import ChatHistoryDB
+
+_WORDS = (
+    "model context token cache memory thread render query index window layout "
+    "python function value error result request response history message latency "
+    "batch sample vector matrix parse format stream buffer config option default"
+).split()
+
+_CODE_SNIPPETS = [
+    "def {name}(items):\n    total = 0\n    for item in items:\n        total += item.{attr}\n    return total",
+    "class {Name}:\n    def __init__(self, {attr}):\n        self.{attr} = {attr}\n\n    def __repr__(self):\n        return f\"{Name}({{self.{attr}!r}})\"",
+    "with open(\"{name}.json\") as f:\n    data = json.load(f)\nprint(data[\"{attr}\"])",
+]
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(_WORDS, k=rng.randint(6, 16))
+    return " ".join(words).capitalize() + "."
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(2, 5)))
+
+def _code_block(rng: random.Random) -> str:
+    name, attr = rng.sample(_WORDS, 2)
+    code = rng.choice(_CODE_SNIPPETS).format(name=name, attr=attr, Name=name.capitalize())
+    return f"```python\n{code}\n```"
+
+def _table(rng: random.Random) -> str:
+    columns = rng.sample(_WORDS, 3)
+    rows = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for _ in range(rng.randint(2, 5)):
+        rows.append("| " + " | ".join(str(rng.randint(0, 999)) for _ in columns) + " |")
+    return "\n".join(rows)
+
+def _bullets(rng: random.Random) -> str:
+    return "\n".join(f"- **{rng.choice(_WORDS)}**: {_sentence(rng)}" for _ in range(rng.randint(2, 6)))
+
+def user_message(rng: random.Random) -> str:
+    """A short question, sometimes with inline code"""
+    text = _sentence(rng)
+    if rng.random() < 0.3:
+        text += f" What does `{rng.choice(_WORDS)}()` return?"
+    return text
+
+def assistant_message(rng: random.Random) -> str:
+    """A markdown answer mixing paragraphs, lists, code blocks and tables"""
+    parts = [_paragraph(rng)]
+    for _ in range(rng.randint(0, 3)):
+        parts.append(rng.choice([_paragraph, _bullets, _code_block, _code_block, _table])(rng))
+    return "\n\n".join(parts)
+
+def generate_history_db(db_path: str, conversations: int, messages_per_conversation: int, seed: int = 0, storage_limit_mb: int = 100000) -> ChatHistoryDB:
+    """Create (or extend) a history database with synthetic conversations.
+
+    Each message is one user/assistant exchange, so a conversation of M
+    messages renders as 2*M bubbles. Timestamps are spread over the past so
+    ordering matches a database built up by real use.
+    """
+    rng = random.Random(seed)
+    history_db = ChatHistoryDB(db_path, storage_limit_mb=storage_limit_mb)
+    start = time.time() - conversations * messages_per_conversation * 60
+    clock = start
+    conversation_rows: List[tuple] = []
+    message_rows: List[tuple] = []
+    for _ in range(conversations):
+        convo_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        conversation_rows.append((convo_id, " ".join(rng.choices(_WORDS, k=4)).capitalize(), _timestamp(clock)))
+        for _ in range(messages_per_conversation):
+            clock += rng.randint(5, 60)
+            message_rows.append((convo_id, _timestamp(clock), user_message(rng), assistant_message(rng)))
+        clock += 60
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany('INSERT INTO conversations (id, summary, created_at) VALUES (?, ?, ?)', conversation_rows)
+        conn.executemany('INSERT INTO chat_history (conversation_id, timestamp, user_message, llm_response) VALUES (?, ?, ?, ?)', message_rows)
+        conn.commit()
+    return history_db
+
+def _timestamp(seconds: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
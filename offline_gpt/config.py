@@ -0,0 +1,42 @@
+import json
+import os
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("offline-gpt")
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../config.json')
+
+# Values used for any key missing from config.json
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "chat_history_storage_limit_mb": 100,
+    # Run the model in a separate process so a llama.cpp crash cannot take the UI down
+    "llm_worker_process": False,
+    # Evaluate history and the draft message into the KV cache while typing
+    "speculative_prefill": True,
+    # Context window in tokens; null uses the model's trained maximum (larger values are clamped to it)
+    "context_length": 2048,
+    # KV cache precision: "f16", "q8_0" or "q4_0" (quantized types roughly halve or quarter its memory)
+    "kv_cache_type": "f16",
+    # Release the model after this many minutes without activity (0 disables); it reloads on focus or send
+    "idle_unload_minutes": 30,
+    # Also release it once the UI has been idle a minute while free system memory is below this (0 disables)
+    "unload_below_available_mb": 512,
+    # Sample memory use into logs/metrics.jsonl (also enabled by --diagnostics)
+    "diagnostics_enabled": False,
+    "diagnostics_interval_seconds": 60,
+    "diagnostics_growth_warning_mb": 200,
+}
+
+def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """Load config.json merged over DEFAULT_CONFIG; a missing or invalid file yields the defaults"""
+    path = path or CONFIG_PATH
+    config = dict(DEFAULT_CONFIG)
+    if not os.path.exists(path):
+        return config
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable config file {path}: {e}")
+    return config
@@ -31,6 +31,10 @@ class ChatHistoryDB:
                     FOREIGN KEY(conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
                 )
             ''')
+            # Keyset pagination walks conversations newest first
+            c.execute('CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations (created_at DESC, id DESC)')
+            # Opening a conversation reads its messages in order without a table scan
+            c.execute('CREATE INDEX IF NOT EXISTS idx_chat_history_conversation ON chat_history (conversation_id, timestamp, id)')
             conn.commit()
 
     # Conversation management
@@ -48,6 +52,30 @@ class ChatHistoryDB:
             c.execute('SELECT id, summary FROM conversations ORDER BY created_at DESC')
             return c.fetchall()
 
+    def get_conversations_page(self, limit: int, after: Optional[Tuple[str, str]] = None) -> List[Tuple[str, str, str]]:
+        """Return up to ``limit`` (id, summary, created_at) rows, newest first.
+
+        ``after`` is the (created_at, id) key of the last row of the previous
+        page; rows strictly older than it are returned.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            if after is None:
+                c.execute('SELECT id, summary, created_at FROM conversations ORDER BY created_at DESC, id DESC LIMIT ?', (limit,))
+            else:
+                created_at, conversation_id = after
+                c.execute(
+                    'SELECT id, summary, created_at FROM conversations WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?',
+                    (created_at, conversation_id, limit)
+                )
+            return c.fetchall()
+
+    def get_conversation(self, conversation_id: str) -> Optional[Tuple[str, str, str]]:
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, summary, created_at FROM conversations WHERE id = ?', (conversation_id,))
+            return c.fetchone()
+
     def update_conversation_summary(self, conversation_id: str, summary: str):
         with sqlite3.connect(self.db_path) as conn:
             c = conn.cursor()
@@ -68,10 +96,18 @@ class ChatHistoryDB:
             conn.commit()
         self._enforce_storage_limit()
 
+    def add_messages(self, rows: List[Tuple[str, str, str, str]]):
+        """Insert (conversation_id, timestamp, user_message, llm_response) rows in one transaction"""
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.executemany('INSERT INTO chat_history (conversation_id, timestamp, user_message, llm_response) VALUES (?, ?, ?, ?)', rows)
+            conn.commit()
+        self._enforce_storage_limit()
+
     def get_history(self, conversation_id: str):
         with sqlite3.connect(self.db_path) as conn:
             c = conn.cursor()
-            c.execute('SELECT * FROM chat_history WHERE conversation_id = ? ORDER BY timestamp ASC', (conversation_id,))
+            c.execute('SELECT * FROM chat_history WHERE conversation_id = ? ORDER BY timestamp ASC, id ASC', (conversation_id,))
             return c.fetchall()
 
     def delete_message(self, message_id: int):
@@ -0,0 +1,155 @@
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from offline_gpt.database.history import ChatHistoryDB
+
+logger = logging.getLogger("offline-gpt")
+
+class ConversationStore:
+    """In-memory message lists per conversation, persisted write-behind.
+
+    Recently used conversations are kept in an LRU cache of role/content
+    message dicts, which serve both the chat view and prompt building. New
+    exchanges are appended to the cache immediately and written to SQLite by a
+    background thread in batched transactions. ``close`` (also registered with
+    ``atexit``) flushes anything still pending.
+    """
+
+    def __init__(self, history_db: ChatHistoryDB, max_conversations: int = 8, flush_interval: float = 0.5, batch_size: int = 64):
+        self.history_db = history_db
+        self.max_conversations = max_conversations
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._cache: "OrderedDict[str, List[Dict[str, str]]]" = OrderedDict()
+        # Rows not yet written: (conversation_id, timestamp, user_message, llm_response)
+        self._pending: List[Tuple[str, str, str, str]] = []
+        # Conversations deleted through the store; a reply that arrives for one
+        # afterwards is dropped rather than written as orphan rows
+        self._deleted: Set[str] = set()
+        # Guards _cache and _pending
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Held while a batch is being written so loads, clears and deletes
+        # never interleave with an in-flight write
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def get_messages(self, conversation_id: str) -> List[Dict[str, str]]:
+        """Return a copy of the conversation's messages, loading them on a cache miss"""
+        with self._lock:
+            messages = self._cache.get(conversation_id)
+            if messages is not None:
+                self._cache.move_to_end(conversation_id)
+                return list(messages)
+        with self._write_lock:
+            # Write anything pending first so the database read below is complete
+            self._write_pending()
+            messages = []
+            for row in self.history_db.get_history(conversation_id):
+                _id, _convo_id, timestamp, user_msg, llm_resp = row
+                messages.extend(self._to_messages(timestamp, user_msg, llm_resp))
+            with self._lock:
+                # Exchanges appended after the write above are still pending
+                for convo_id, timestamp, user_msg, llm_resp in self._pending:
+                    if convo_id == conversation_id:
+                        messages.extend(self._to_messages(timestamp, user_msg, llm_resp))
+                self._cache[conversation_id] = messages
+                self._evict()
+                return list(messages)
+
+    def append_exchange(self, conversation_id: str, user_message: str, llm_response: str):
+        """Record a user message and its reply; persisted by the writer thread"""
+        # Same format as SQLite's CURRENT_TIMESTAMP so ordering stays consistent
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        with self._lock:
+            if conversation_id in self._deleted:
+                logger.info(f"Dropping exchange for deleted conversation {conversation_id}")
+                return
+            messages = self._cache.get(conversation_id)
+            if messages is not None:
+                messages.extend(self._to_messages(timestamp, user_message, llm_response))
+                self._cache.move_to_end(conversation_id)
+            self._pending.append((conversation_id, timestamp, user_message, llm_response))
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def clear_conversation(self, conversation_id: str):
+        with self._write_lock:
+            with self._lock:
+                self._drop_pending(conversation_id)
+                if conversation_id in self._cache:
+                    self._cache[conversation_id] = []
+            self.history_db.clear_history(conversation_id)
+
+    def delete_conversation(self, conversation_id: str):
+        with self._write_lock:
+            with self._lock:
+                self._drop_pending(conversation_id)
+                self._cache.pop(conversation_id, None)
+                self._deleted.add(conversation_id)
+            self.history_db.delete_conversation(conversation_id)
+
+    def flush(self):
+        """Write all pending exchanges now"""
+        with self._write_lock:
+            self._write_pending()
+
+    def close(self):
+        """Stop the writer thread and flush; safe to call more than once"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join(timeout=5)
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                # Let further exchanges join this group commit unless the batch is full
+                if len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def _write_pending(self):
+        # Caller holds _write_lock
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            self.history_db.add_messages(batch)
+            logger.info(f"Flushed {len(batch)} chat exchanges to history database")
+        except Exception as e:
+            logger.error(f"Failed to write chat history, will retry: {e}")
+            with self._lock:
+                self._pending[:0] = batch
+
+    def _drop_pending(self, conversation_id: str):
+        self._pending = [row for row in self._pending if row[0] != conversation_id]
+
+    def _evict(self):
+        while len(self._cache) > self.max_conversations:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _to_messages(timestamp: str, user_message: str, llm_response: str) -> List[Dict[str, str]]:
+        messages = []
+        if user_message:
+            messages.append({"role": "user", "content": user_message, "timestamp": timestamp})
+        if llm_response:
+            messages.append({"role": "assistant", "content": llm_response, "timestamp": timestamp})
+        return messages
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("offline-gpt")
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+def available_memory_bytes() -> Optional[int]:
+    """Memory the system can still hand out without swapping, or None where it cannot be read"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        return None
+
+class MetricsLog:
+    """Appends one JSON object per line to a metrics file; safe to use from any thread.
+
+    An existing file larger than ``max_bytes`` is rotated to ``<path>.1`` when
+    the log is opened.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 5 * 1024 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+            os.replace(path, path + ".1")
+
+    def write(self, kind: str, **fields: Any):
+        record = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "kind": kind}
+        record.update(fields)
+        line = json.dumps(record, default=str)
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+class HeapTracker:
+    """Python heap statistics from tracemalloc (started here if not already tracing)"""
+
+    def __init__(self, frames: int = 10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._previous = self._snapshot()
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def traced_bytes(self) -> Dict[str, int]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"current": current, "peak": peak}
+
+    def top_allocators(self, limit: int = 10) -> List[Dict[str, Any]]:
+        stats = self._snapshot().statistics("lineno")[:limit]
+        return [{"where": str(stat.traceback), "size": stat.size, "count": stat.count} for stat in stats]
+
+    def diff(self, limit: int = 15) -> List[Dict[str, Any]]:
+        """Largest changes since the previous diff (or since tracking started)"""
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self._previous, "lineno")[:limit]
+        self._previous = snapshot
+        return [{"where": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff, "size": stat.size} for stat in stats]
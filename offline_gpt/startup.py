@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+from typing import List, Optional, TextIO, Tuple
+
+
+def process_age(pid: Optional[int] = None) -> Optional[float]:
+    """Seconds since the OS created process ``pid`` (this one by default), or None where it cannot be read"""
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces; starttime is the 22nd field
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        return time.time() - psutil.Process(pid).create_time()
+    except psutil.Error:
+        return None
+
+
+def launcher_pid() -> int:
+    """The process the user started.
+
+    A PyInstaller one-file build runs the app in a child of a bootloader that
+    first unpacks it into a ``_MEI*`` directory, so that parent is returned.
+    """
+    meipass = getattr(sys, "_MEIPASS", None)
+    if getattr(sys, "frozen", False) and meipass and os.path.basename(os.path.normpath(meipass)).startswith("_MEI"):
+        return os.getppid()
+    return os.getpid()
+
+
+def process_start(fallback: float) -> Tuple[float, str]:
+    """The launcher's creation time on the perf_counter clock, and a description of it.
+
+    Falls back to ``fallback`` (a perf_counter reading taken as early as
+    possible in the interpreter) where the creation time cannot be read.
+    """
+    pid = launcher_pid()
+    age = process_age(pid)
+    if age is None:
+        return fallback, "interpreter start; process creation time unavailable"
+    origin = "launcher process creation" if pid != os.getpid() else "process creation"
+    return time.perf_counter() - age, origin
+
+
+class StartupTrace:
+    """Records named startup phases and prints a timing breakdown.
+
+    When disabled, ``mark`` and ``report`` are no-ops so call sites do not
+    need to check whether tracing was requested.
+    """
+
+    def __init__(self, enabled: bool = False, start: Optional[float] = None, origin: str = "trace start"):
+        self.enabled = enabled
+        self.start = start if start is not None else time.perf_counter()
+        self.origin = origin
+        self.phases: List[Tuple[str, float]] = []
+        self.reported = False
+
+    def mark(self, phase: str):
+        if self.enabled:
+            self.phases.append((phase, time.perf_counter()))
+
+    def report(self, stream: Optional[TextIO] = None):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        stream = stream or sys.stderr
+        stream.write(f"Startup trace (ms since {self.origin}):\n")
+        previous = self.start
+        for phase, stamp in self.phases:
+            stream.write(f"  {phase:<28} +{(stamp - previous) * 1000:8.1f}  {(stamp - self.start) * 1000:8.1f}\n")
+            previous = stamp
+        stream.flush()
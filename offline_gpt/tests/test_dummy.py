@@ -8,7 +8,16 @@ import pytest
 import os
 import tempfile
 from offline_gpt.database.history import ChatHistoryDB
+from offline_gpt.database.store import ConversationStore
 from offline_gpt.backend.llm import LLMBackend
+from offline_gpt.backend.batch import BatchedGenerator, common_prefix_length, sample_token
+from offline_gpt.backend.worker import LLMWorkerClient
+from offline_gpt.backend.gguf import read_gguf_metadata, context_plan
+from offline_gpt.config import load_config, DEFAULT_CONFIG
+from offline_gpt.startup import StartupTrace
+from offline_gpt.diagnostics import MetricsLog, HeapTracker, current_rss_bytes, available_memory_bytes
+from offline_gpt.bench.fake_llama import FakeLlama
+from offline_gpt.bench.synthetic import generate_history_db
 
 
 class TestChatHistoryDB:
@@ -59,6 +68,92 @@ class TestChatHistoryDB:
         # Verify conversation is deleted
         conversations = self.db.get_conversations()
         assert len(conversations) == 0
+    
+    def test_conversation_pages_cover_all_rows_once(self):
+        """Test that keyset pages return every conversation exactly once, newest first."""
+        ids = [self.db.create_conversation(f"Conversation {i}") for i in range(7)]
+        
+        seen = []
+        after = None
+        while True:
+            page = self.db.get_conversations_page(3, after)
+            if not page:
+                break
+            seen.extend(row[0] for row in page)
+            last_id, _summary, last_created = page[-1]
+            after = (last_created, last_id)
+        
+        assert sorted(seen) == sorted(ids)
+        assert seen == [row[0] for row in self.db.get_conversations_page(100)]
+
+
+class TestConversationStore:
+    """Test cases for the ConversationStore class."""
+    
+    def setup_method(self):
+        """Set up test database and store."""
+        self.temp_db_path = tempfile.mktemp(suffix='.db')
+        self.db = ChatHistoryDB(self.temp_db_path, storage_limit_mb=10)
+        self.store = ConversationStore(self.db, max_conversations=2, flush_interval=60)
+    
+    def teardown_method(self):
+        """Clean up store and test database."""
+        self.store.close()
+        if os.path.exists(self.temp_db_path):
+            os.remove(self.temp_db_path)
+    
+    def test_append_is_visible_before_flush(self):
+        """Test that appended exchanges are served from memory and persisted on flush."""
+        convo_id = self.db.create_conversation("Test Conversation")
+        assert self.store.get_messages(convo_id) == []
+        self.store.append_exchange(convo_id, "Hello", "Hi there!")
+        
+        messages = self.store.get_messages(convo_id)
+        assert [m["role"] for m in messages] == ["user", "assistant"]
+        assert messages[1]["content"] == "Hi there!"
+        
+        self.store.flush()
+        history = self.db.get_history(convo_id)
+        assert len(history) == 1
+        assert history[0][3] == "Hello"
+    
+    def test_evicted_conversation_reloads_pending_writes(self):
+        """Test that a conversation evicted from the LRU keeps its unflushed messages."""
+        ids = [self.db.create_conversation(f"Conversation {i}") for i in range(3)]
+        for convo_id in ids:
+            self.store.get_messages(convo_id)
+            self.store.append_exchange(convo_id, f"Question {convo_id}", "Answer")
+        
+        messages = self.store.get_messages(ids[0])
+        assert messages[0]["content"] == f"Question {ids[0]}"
+        assert len(messages) == 2
+    
+    def test_close_flushes_pending(self):
+        """Test that closing the store writes pending exchanges."""
+        convo_id = self.db.create_conversation("Test Conversation")
+        self.store.append_exchange(convo_id, "Hello", "Hi there!")
+        self.store.close()
+        assert len(self.db.get_history(convo_id)) == 1
+    
+    def test_clear_drops_pending(self):
+        """Test that clearing a conversation discards unflushed exchanges."""
+        convo_id = self.db.create_conversation("Test Conversation")
+        self.store.append_exchange(convo_id, "Hello", "Hi there!")
+        self.store.clear_conversation(convo_id)
+        self.store.flush()
+        assert self.store.get_messages(convo_id) == []
+        assert self.db.get_history(convo_id) == []
+    
+    def test_append_after_delete_is_dropped(self):
+        """Test that a reply arriving for a deleted conversation leaves no orphan rows."""
+        import sqlite3
+        convo_id = self.db.create_conversation("Test Conversation")
+        self.store.append_exchange(convo_id, "Hello", "Hi there!")
+        self.store.delete_conversation(convo_id)
+        self.store.append_exchange(convo_id, "Still there?", "Late reply")
+        self.store.flush()
+        with sqlite3.connect(self.temp_db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0] == 0
 
 
 class TestLLMBackend:
@@ -69,10 +164,683 @@ class TestLLMBackend:
         with pytest.raises(FileNotFoundError):
             LLMBackend("/nonexistent/model.gguf")
     
+    def test_worker_model_path_validation(self):
+        """Test that the worker process reports a missing model as FileNotFoundError."""
+        with pytest.raises(FileNotFoundError):
+            LLMWorkerClient("/nonexistent/model.gguf")
+    
+    def test_common_prefix_length(self):
+        """Test the shared token prefix used for batched decoding."""
+        assert common_prefix_length([[1, 2, 3, 4], [1, 2, 5], [1, 2, 3]]) == 2
+        assert common_prefix_length([[1, 2], [1, 2]]) == 2
+        assert common_prefix_length([[1], [2]]) == 0
+        assert common_prefix_length([]) == 0
+    
+    def test_sample_token(self):
+        """Test greedy, top-k restricted and seeded sampling."""
+        np = pytest.importorskip("numpy")
+        import random
+        logits = np.array([0.5, 3.0, -1.0, 2.5, 0.0, 2.9], dtype=np.float32)
+        assert sample_token(logits, 0.0, 40, random.Random(0)) == 1
+        assert sample_token(logits, -1.0, 1, random.Random(0)) == 1
+        rng = random.Random(1)
+        assert {sample_token(logits, 5.0, 3, rng) for _ in range(300)} <= {1, 3, 5}
+        first = [sample_token(logits, 1.0, 4, random.Random(42)) for _ in range(20)]
+        second = [sample_token(logits, 1.0, 4, random.Random(42)) for _ in range(20)]
+        assert first == second
+    
+    def test_chat_batch_error_reprefills_system_prompt(self, monkeypatch):
+        """Test that a failed batch returns one error per prompt and restores the system prompt cache."""
+        fake = FakeLlama()
+        backend = LLMBackend("/nonexistent/model.gguf", model=fake)
+        system_tokens = list(fake._input_ids)
+        def failing_generate(self, prompts, **kwargs):
+            # Batching takes over the KV cache before failing
+            self.model.reset()
+            raise RuntimeError("decode failed")
+        monkeypatch.setattr(BatchedGenerator, "generate", failing_generate)
+        conversations = [[{"role": "user", "content": "A"}], [{"role": "user", "content": "B"}]]
+        assert backend.chat_batch(conversations) == ["[LLM error: decode failed]"] * 2
+        assert system_tokens and list(fake._input_ids) == system_tokens
+    
+    def test_chat_with_fake_model(self):
+        """Test prompt formatting and streaming against the FakeLlama stand-in."""
+        fake = FakeLlama(reply="Hello there")
+        backend = LLMBackend("/nonexistent/model.gguf", model=fake)
+        tokens = []
+        response = backend.chat("Hi", conversation=[{"role": "user", "content": "Hi"}], on_token=tokens.append)
+        assert response == "Hello there"
+        assert "".join(tokens) == "Hello there"
+        assert fake.prompts[0].endswith("<|user|>\nHi<|end|>\n<|assistant|>\n")
+    
+    def test_prefill_leaves_only_delta_for_generation(self):
+        """Test that prefilling the draft means chat() evaluates almost nothing new."""
+        fake = FakeLlama()
+        backend = LLMBackend("/nonexistent/model.gguf", model=fake)
+        conversation = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+        backend.prefill(conversation, draft="How are you?")
+        before = fake.evaluated
+        backend.chat("How are you?", conversation=conversation + [{"role": "user", "content": "How are you?"}])
+        assert fake.evaluated - before == 1
+    
+    def test_prefill_stops_when_asked(self):
+        """Test that prefill evaluates nothing once should_stop returns True."""
+        backend = LLMBackend("/nonexistent/model.gguf", model=FakeLlama())
+        assert backend.prefill([{"role": "user", "content": "Hi"}], should_stop=lambda: True) == 0
+    
+    def test_unload_and_reload(self, monkeypatch):
+        """Test that an unloaded model is reloaded transparently on the next chat."""
+        loads = []
+        def fake_load(backend):
+            loads.append(backend.model_path)
+            backend.model = FakeLlama(reply="Back again")
+        monkeypatch.setattr(LLMBackend, "_load_model", fake_load)
+        backend = LLMBackend("/models/phi3.gguf")
+        assert backend.loaded and backend.ensure_loaded() is None
+        backend.unload()
+        assert not backend.loaded
+        assert backend.prefill([{"role": "user", "content": "Hi"}]) == 0
+        assert backend.chat("Hi", conversation=[{"role": "user", "content": "Hi"}]) == "Back again"
+        assert len(loads) == 2
+        assert backend.last_reload_seconds is not None
+    
+    def test_failed_reload_returns_error_string(self, monkeypatch):
+        """Test that chat() and chat_batch() report a failed reload as an error reply, not an exception."""
+        backend = LLMBackend("/nonexistent/model.gguf", model=FakeLlama())
+        backend.unload()
+        conversation = [{"role": "user", "content": "Hi"}]
+        assert backend.chat("Hi", conversation=conversation).startswith("[LLM error: Model file not found")
+        replies = backend.chat_batch([conversation, conversation])
+        assert len(replies) == 2 and all(reply.startswith("[LLM error: Model file not found") for reply in replies)
+    
     # Note: Full LLM testing would require a test model file
     # This is a placeholder for when we have a test model
 
 
+class _BatchLlama(FakeLlama):
+    """FakeLlama with the context-level parts BatchedGenerator uses; token 256 is end-of-sequence."""
+    
+    def __init__(self, n_ctx=512, n_batch=512):
+        super().__init__()
+        self.ctx = object()
+        self._n_ctx = n_ctx
+        self.n_batch = n_batch
+    
+    def n_ctx(self):
+        return self._n_ctx
+    
+    def n_vocab(self):
+        return 257
+    
+    def token_eos(self):
+        return 256
+    
+    def detokenize(self, tokens):
+        return bytes(t for t in tokens if t < 256)
+
+
+class _FakeLlamaCpp:
+    """Stand-in for the llama_cpp batch API, replying to sequence ``seq`` with ``replies[seq]``.
+
+    Checks that every batch fits its n_batch and that each sequence's
+    positions are contiguous, and records every decoded (token, pos, seq_id).
+    """
+    
+    def __init__(self, model, prompt_lengths, replies):
+        import ctypes
+        self.model = model
+        self.prompt_lengths = prompt_lengths
+        # Each reply is followed by end-of-sequence
+        self.replies = [list(reply.encode("utf-8")) + [model.token_eos()] for reply in replies]
+        self.cells = {}
+        self.decoded = []
+        self.freed = False
+        self._logits = []
+        self._float_pointer = ctypes.POINTER(ctypes.c_float)
+    
+    def llama_batch_init(self, n_tokens, embd, n_seq_max):
+        from types import SimpleNamespace
+        return SimpleNamespace(capacity=n_tokens, n_tokens=0, token=[0] * n_tokens, pos=[0] * n_tokens,
+                               n_seq_id=[0] * n_tokens, seq_id=[[0] for _ in range(n_tokens)], logits=[False] * n_tokens)
+    
+    def llama_batch_free(self, batch):
+        self.freed = True
+    
+    def llama_kv_cache_clear(self, ctx):
+        self.cells = {}
+    
+    def llama_kv_cache_seq_cp(self, ctx, src, dst, p0, p1):
+        self.cells[dst] = self.cells[src][p0:p1]
+    
+    def llama_decode(self, ctx, batch):
+        import ctypes
+        assert batch.n_tokens <= batch.capacity <= self.model.n_batch
+        self._logits = []
+        for i in range(batch.n_tokens):
+            seq = batch.seq_id[i][0]
+            cells = self.cells.setdefault(seq, [])
+            assert batch.pos[i] == len(cells)
+            cells.append(batch.token[i])
+            self.decoded.append((batch.token[i], batch.pos[i], seq))
+            logits = (ctypes.c_float * self.model.n_vocab())()
+            if batch.logits[i]:
+                logits[self.replies[seq][len(cells) - self.prompt_lengths[seq]]] = 10.0
+            self._logits.append(logits)
+        return 0
+    
+    def llama_get_logits_ith(self, ctx, i):
+        import ctypes
+        return ctypes.cast(self._logits[i], self._float_pointer)
+
+
+class TestBatchedGenerator:
+    """Test cases for BatchedGenerator against a stubbed llama_cpp."""
+    
+    PROMPTS = ["<|system|>\nBe brief.<|end|>\n<|user|>\nHi", "<|system|>\nBe brief.<|end|>\n<|user|>\nHello"]
+    
+    def _generate(self, monkeypatch, model, replies, **kwargs):
+        import sys
+        pytest.importorskip("numpy")
+        lengths = [len(model.tokenize(p.encode("utf-8"), add_bos=True)) for p in self.PROMPTS]
+        llama_cpp = _FakeLlamaCpp(model, lengths, replies)
+        monkeypatch.setitem(sys.modules, "llama_cpp", llama_cpp)
+        texts = BatchedGenerator(model, seed=0).generate(self.PROMPTS, temperature=0.0, **kwargs)
+        return texts, llama_cpp
+    
+    def test_shared_prefix_decoded_once_and_stops_applied(self, monkeypatch):
+        """Test prefix sharing, per-sequence positions, n_batch chunking, and stop tokens and strings."""
+        model = _BatchLlama(n_batch=8)
+        texts, llama_cpp = self._generate(monkeypatch, model, ["Hey", "Sure<|end|>ignored"], stop=["<|end|>"])
+        # Sequence 0 stops at end-of-sequence, sequence 1 at the stop string
+        assert texts == ["Hey", "Sure"]
+        prefix_len = common_prefix_length([model.tokenize(p.encode("utf-8")) for p in self.PROMPTS])
+        assert prefix_len > 8
+        # The shared prefix is decoded once, on sequence 0, and copied to sequence 1
+        prefix_entries = [entry for entry in llama_cpp.decoded if entry[1] < prefix_len]
+        assert [seq for _, _, seq in prefix_entries] == [0] * prefix_len
+        assert llama_cpp.freed
+        assert llama_cpp.cells == {}
+    
+    def test_max_tokens_clamped_to_free_context(self, monkeypatch):
+        """Test that generation stops where the context runs out of cells for every sequence."""
+        lengths = [len(p) + 1 for p in self.PROMPTS]
+        prefix_len = common_prefix_length([p.encode("utf-8") for p in self.PROMPTS]) + 1
+        prompt_cells = prefix_len + sum(length - prefix_len for length in lengths)
+        model = _BatchLlama(n_ctx=prompt_cells + 2 * 3)
+        texts, _ = self._generate(monkeypatch, model, ["abcdefgh", "ABCDEFGH"], max_tokens=100)
+        assert texts == ["abc", "ABC"]
+    
+    def test_more_prompts_than_n_batch_rejected(self, monkeypatch):
+        """Test that a batch wider than the context's n_batch raises instead of reaching llama_decode."""
+        model = _BatchLlama(n_batch=1)
+        with pytest.raises(ValueError):
+            self._generate(monkeypatch, model, ["a", "b"])
+
+
+def _write_gguf(path, metadata):
+    """Write a GGUF header with the given scalar/string/array key-values and no tensors."""
+    import struct
+    def string(text):
+        data = text.encode("utf-8")
+        return struct.pack("<Q", len(data)) + data
+    body = b""
+    for key, value in metadata.items():
+        body += string(key)
+        if isinstance(value, str):
+            body += struct.pack("<I", 8) + string(value)
+        elif isinstance(value, list):
+            body += struct.pack("<IIQ", 9, 8, len(value)) + b"".join(string(item) for item in value)
+        else:
+            body += struct.pack("<II", 4, value)
+    with open(path, "wb") as f:
+        f.write(b"GGUF" + struct.pack("<IQQ", 3, 0, len(metadata)) + body)
+
+
+class TestGGUF:
+    """Test cases for GGUF metadata and KV cache sizing."""
+    
+    METADATA = {
+        "general.architecture": "phi3",
+        "tokenizer.ggml.tokens": ["<s>", "</s>", "hello"],
+        "phi3.context_length": 4096,
+        "phi3.block_count": 32,
+        "phi3.embedding_length": 3072,
+        "phi3.attention.head_count": 32,
+    }
+    
+    def test_read_metadata_skips_arrays(self):
+        """Test that scalars and strings are read and arrays skipped."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.gguf")
+            _write_gguf(path, self.METADATA)
+            metadata = read_gguf_metadata(path)
+        assert metadata["general.architecture"] == "phi3"
+        assert metadata["phi3.context_length"] == 4096
+        assert metadata["phi3.attention.head_count"] == 32
+        assert "tokenizer.ggml.tokens" not in metadata
+    
+    def test_context_plan(self):
+        """Test context clamping and that q8_0 roughly halves the KV cache."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.gguf")
+            _write_gguf(path, self.METADATA)
+            full = context_plan(path, None, "f16")
+            clamped = context_plan(path, 8192, "f16")
+            quantized = context_plan(path, 4096, "q8_0")
+            with pytest.raises(ValueError):
+                context_plan(path, 2048, "q3_k")
+        assert full["n_ctx"] == clamped["n_ctx"] == 4096
+        assert full["kv_bytes"] == 2 * 4096 * 32 * 3072 * 2
+        assert quantized["kv_bytes"] == full["kv_bytes"] * 17 // 32
+    
+    def test_unreadable_header_falls_back(self):
+        """Test that a file that is not GGUF still yields a usable plan."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.gguf")
+            with open(path, "wb") as f:
+                f.write(b"not a model")
+            plan = context_plan(path, None)
+        assert plan["n_ctx"] == 2048
+        assert plan["kv_bytes"] is None
+
+
+class TestSyntheticHistory:
+    """Test cases for the synthetic benchmark data generator."""
+    
+    def test_generates_requested_sizes(self, tmp_path):
+        """Test that the generator creates N conversations of M exchanges."""
+        db = generate_history_db(str(tmp_path / "bench.db"), conversations=3, messages_per_conversation=4, seed=1)
+        conversations = db.get_conversations()
+        assert len(conversations) == 3
+        for convo_id, _summary in conversations:
+            history = db.get_history(convo_id)
+            assert len(history) == 4
+            assert all(row[3] and row[4] for row in history)
+
+
+class TestConfig:
+    """Test cases for config loading."""
+    
+    def test_missing_keys_use_defaults(self, tmp_path):
+        """Test that keys absent from config.json fall back to defaults."""
+        path = tmp_path / "config.json"
+        path.write_text('{"chat_history_storage_limit_mb": 5}')
+        config = load_config(str(path))
+        assert config["chat_history_storage_limit_mb"] == 5
+        assert config["llm_worker_process"] == DEFAULT_CONFIG["llm_worker_process"]
+
+
+class TestTheme:
+    """Test cases for the palette-based theme engine."""
+    
+    def test_themes_define_same_tokens(self):
+        """Test that every theme defines every token the paint code reads."""
+        pytest.importorskip("PySide6")
+        from offline_gpt.ui.theme import THEMES
+        assert THEMES["light"].keys() == THEMES["dark"].keys()
+    
+    def test_apply_theme_switches_palette_and_colors(self, qapp):
+        """Test that apply_theme changes the token colors and the application palette."""
+        from PySide6.QtGui import QPalette
+        from offline_gpt.ui import theme
+        try:
+            theme.apply_theme("light")
+            light_bubble = theme.color("llm_bubble")
+            theme.apply_theme("dark")
+            assert theme.color("llm_bubble") != light_bubble
+            assert theme.color("llm_bubble").name() == theme.THEMES["dark"]["llm_bubble"]
+            assert qapp.palette().color(QPalette.ColorRole.Window).name() == theme.THEMES["dark"]["window"]
+        finally:
+            theme.apply_theme("light")
+        assert qapp.palette().color(QPalette.ColorRole.Window).name() == theme.THEMES["light"]["window"]
+    
+    def test_toggle_theme_sets_no_stylesheets(self, chat_window, qapp):
+        """Test that toggling the theme styles nothing through stylesheets, on the window or on bubbles."""
+        from PySide6.QtGui import QPalette
+        from offline_gpt.ui import theme
+        from PySide6.QtWidgets import QWidget
+        from offline_gpt.ui.main_window import ChatBubble
+        window = chat_window
+        window.add_chat_bubble("You", "Hello", is_user=True)
+        window.add_chat_bubble("LLM", "**Hi**", is_user=False)
+        try:
+            window.toggle_theme()
+            assert qapp.palette().color(QPalette.ColorRole.Base).name() == theme.THEMES["dark"]["base"]
+            assert qapp.styleSheet() == "" and window.styleSheet() == ""
+            bubbles = window.chat_container.findChildren(ChatBubble)
+            assert len(bubbles) == 2
+            for bubble in bubbles:
+                assert all(widget.styleSheet() == "" for widget in [bubble] + bubble.findChildren(QWidget))
+        finally:
+            window.toggle_theme()
+
+
+@pytest.fixture
+def qapp():
+    """The QApplication, on an offscreen display."""
+    pytest.importorskip("PySide6")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def chat_window(qapp):
+    """A ChatWindow with a temporary database and the fake model."""
+    from offline_gpt.ui.main_window import ChatWindow
+    app = qapp
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ChatHistoryDB(os.path.join(tmp, "chat.db"), storage_limit_mb=100)
+        window = ChatWindow(history_db=db, llm=LLMBackend("fake.gguf", model=FakeLlama()))
+        yield window
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+
+
+class TestChatWindow:
+    """Test cases for the ChatWindow against an offscreen display."""
+    
+    def test_reply_kept_after_switching_conversation(self, chat_window):
+        """Test that a reply arriving after the user opened another conversation is still stored."""
+        from PySide6.QtCore import QCoreApplication, QEvent
+        window = chat_window
+        first = window.history_db.create_conversation("First")
+        second = window.history_db.create_conversation("Second")
+        # Hold the reply back so it can be delivered after the switch
+        window._get_llm_and_display = lambda *args: None
+        window.current_conversation_id = second
+        window._load_history()
+        window.input_box.setText("Hello")
+        window.send_message()
+        window.current_conversation_id = first
+        window._load_history()
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        window._handle_llm_response(second, "Hi there", "Hello", "2024-01-01 00:00:00", 600)
+        window.store.flush()
+        assert [m["content"] for m in window.store.get_messages(second)] == ["Hello", "Hi there"]
+        assert len(window.history_db.get_history(second)) == 1
+        assert window.loading_bubble is None
+    
+    def test_delete_conversation_by_id_after_rows_shift(self, chat_window, monkeypatch):
+        """Test that deleting by id removes that conversation even after a row is inserted above it."""
+        from PySide6.QtWidgets import QMessageBox
+        monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.StandardButton.Yes)
+        window = chat_window
+        target = window.history_db.create_conversation("Target")
+        window.convo_model.reload()
+        window.create_conversation()
+        assert window.convo_model.row_of(target) == 1
+        window.delete_conversation(target)
+        assert window.convo_model.row_of(target) == -1
+        assert window.convo_model.rowCount() == 1
+        assert [row[0] for row in window.history_db.get_conversations()] == [window.current_conversation_id]
+    
+    def test_metrics_log_opened_only_when_needed(self, chat_window):
+        """Test that a window without diagnostics does not create the metrics log."""
+        assert chat_window.watchdog is None
+        assert chat_window._metrics is None
+    
+    def test_memory_baseline_reset_after_model_load(self, qapp, monkeypatch):
+        """Test that the memory a model load takes is not reported as growth."""
+        import tracemalloc
+        from offline_gpt.ui import main_window
+        from offline_gpt.ui.main_window import ChatWindow
+        with tempfile.TemporaryDirectory() as tmp:
+            monkeypatch.setattr(main_window, "METRICS_FILE", os.path.join(tmp, "metrics.jsonl"))
+            db = ChatHistoryDB(os.path.join(tmp, "chat.db"), storage_limit_mb=100)
+            window = ChatWindow(history_db=db, llm=LLMBackend("fake.gguf", model=FakeLlama()), diagnostics=True)
+            try:
+                warnings = []
+                window.watchdog.growth_warning.connect(warnings.append)
+                window.watchdog.growth_warning_mb = 100
+                # As if the model had taken 2 GB since the watchdog started
+                window.watchdog._baseline_rss -= 2 * 1024 * 1024 * 1024
+                window.llm = window._provided_llm
+                window._on_llm_loaded()
+                window.watchdog.sample()
+                assert warnings == []
+                window.watchdog._baseline_rss -= 2 * 1024 * 1024 * 1024
+                window.watchdog.sample()
+                assert len(warnings) == 1
+            finally:
+                window.close()
+                window.deleteLater()
+                qapp.processEvents()
+                tracemalloc.stop()
+    
+    def test_switch_keeps_event_loop_passes_short(self, chat_window, qapp):
+        """Test that switching between long conversations never blocks the event loop for long."""
+        import time
+        from PySide6.QtCore import QTimer
+        window = chat_window
+        conversations = []
+        for summary in ("First", "Second"):
+            convo_id = window.history_db.create_conversation(summary)
+            for i in range(50):
+                window.store.append_exchange(convo_id, f"Question {i}", f"**Answer {i}**\n\n- one\n- two")
+            conversations.append(convo_id)
+        window.resize(800, 700)
+        window.show()
+        _process_events_until(lambda: window._first_frame_shown)
+        passes = []
+        last = [time.perf_counter()]
+        def tick():
+            now = time.perf_counter()
+            passes.append(now - last[0])
+            last[0] = now
+        probe = QTimer()
+        probe.setInterval(0)
+        probe.timeout.connect(tick)
+        probe.start()
+        for convo_id in conversations + conversations:
+            QTimer.singleShot(0, lambda convo_id=convo_id: window.select_conversation(window.convo_model.index(window.convo_model.row_of(convo_id))))
+            _process_events_until(lambda: window.current_conversation_id == convo_id)
+            _process_events_until(lambda: window.history_loaded() and not window._discarded_containers and not window._discarded_bubbles)
+            # Only the bubbles near the view are built
+            assert window._history_next_older > 0
+        probe.stop()
+        # A pass builds about one bubble; building or deleting a whole
+        # conversation in one pass takes several times longer
+        assert max(passes) < 0.1
+
+
+
+class TestConversationListModel:
+    """Test cases for the paged sidebar ConversationListModel."""
+    
+    @pytest.fixture
+    def model(self, qapp):
+        from offline_gpt.ui.conversation_model import ConversationListModel
+        with tempfile.TemporaryDirectory() as tmp:
+            db = ChatHistoryDB(os.path.join(tmp, "chat.db"), storage_limit_mb=100)
+            for i in range(5):
+                db.create_conversation(f"Conversation {i}")
+            yield ConversationListModel(db, page_size=2)
+    
+    def test_fetch_more_pages_to_exhaustion(self, model):
+        """Test that each fetchMore adds one page until every conversation is loaded."""
+        assert model.rowCount() == 0 and model.canFetchMore()
+        counts = []
+        while model.canFetchMore():
+            model.fetchMore()
+            counts.append(model.rowCount())
+        assert counts == [2, 4, 5]
+        ids = [model.conversation_id_at(row) for row in range(5)]
+        assert len(set(ids)) == 5
+        assert [row[0] for row in model.history_db.get_conversations()] == ids
+    
+    def test_row_level_changes(self, model):
+        """Test prepend, single-row dataChanged on summary update, and removal."""
+        from PySide6.QtCore import Qt
+        model.reload()
+        new_id = model.history_db.create_conversation("Newest")
+        model.prepend_conversation(new_id)
+        assert model.rowCount() == 3
+        assert model.conversation_id_at(0) == new_id
+        assert model.index(0).data() == "Newest"
+        
+        changed = []
+        model.dataChanged.connect(lambda top, bottom, roles: changed.append((top.row(), bottom.row())))
+        second_id = model.conversation_id_at(1)
+        model.update_summary(second_id, "Renamed")
+        assert changed == [(1, 1)]
+        assert model.index(1).data() == "Renamed"
+        assert model.index(1).data(Qt.ItemDataRole.UserRole) == second_id
+        
+        model.remove_conversation(new_id)
+        assert model.rowCount() == 2
+        assert model.row_of(new_id) == -1
+        assert model.conversation_id_at(0) == second_id
+
+
+def _process_events_until(predicate, timeout=5.0):
+    import time
+    from PySide6.QtCore import QCoreApplication
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.001)
+    return predicate()
+
+
+class TestRenderPipeline:
+    """Test cases for the off-thread markdown RenderPipeline."""
+    
+    @pytest.fixture
+    def pipeline(self, qapp):
+        from offline_gpt.ui.render import RenderPipeline
+        pipeline = RenderPipeline(max_workers=1)
+        results = []
+        pipeline.rendered.connect(lambda generation, index, html: results.append((generation, index, html)))
+        yield pipeline, results
+        pipeline.shutdown()
+    
+    def test_results_arrive_tail_first(self, pipeline, monkeypatch):
+        """Test that the newest message is rendered and delivered first."""
+        from offline_gpt.ui import render
+        monkeypatch.setattr(render, "render_markdown", lambda text: f"<p>{text}</p>")
+        pipeline, results = pipeline
+        generation = pipeline.start(["oldest", "middle", "newest"])
+        assert _process_events_until(lambda: len(results) == 3)
+        assert results == [(generation, 2, "<p>newest</p>"), (generation, 1, "<p>middle</p>"), (generation, 0, "<p>oldest</p>")]
+    
+    def test_stale_generations_are_suppressed(self, pipeline, monkeypatch):
+        """Test that cancel() and a new start() drop results of the previous generation."""
+        import threading
+        from offline_gpt.ui import render
+        started, release = threading.Event(), threading.Event()
+        def slow_render(text):
+            started.set()
+            release.wait(5)
+            return text
+        monkeypatch.setattr(render, "render_markdown", slow_render)
+        pipeline, results = pipeline
+        first = pipeline.start(["a", "b"])
+        assert started.wait(5)
+        # The in-flight render finishes after cancel() and must not be delivered
+        pipeline.cancel()
+        release.set()
+        second = pipeline.start(["c"])
+        assert _process_events_until(lambda: len(results) == 1)
+        _process_events_until(lambda: False, timeout=0.1)
+        assert second != first
+        assert results == [(second, 0, "c")]
+
+
+class TestStartupTrace:
+    """Test cases for the StartupTrace class."""
+    
+    def test_report_lists_phases_in_order(self):
+        """Test that every marked phase is reported once."""
+        import io
+        trace = StartupTrace(enabled=True)
+        trace.mark("first")
+        trace.mark("second")
+        stream = io.StringIO()
+        trace.report(stream)
+        trace.report(stream)
+        output = stream.getvalue()
+        assert output.count("first") == 1
+        assert output.index("first") < output.index("second")
+    
+    def test_disabled_trace_is_silent(self):
+        """Test that a disabled trace records and prints nothing."""
+        import io
+        trace = StartupTrace()
+        trace.mark("phase")
+        stream = io.StringIO()
+        trace.report(stream)
+        assert trace.phases == []
+        assert stream.getvalue() == ""
+    
+    def test_process_start_precedes_interpreter(self):
+        """Test that the trace starts from process creation, which is before now."""
+        import io
+        import time
+        from offline_gpt.startup import process_age, process_start
+        age = process_age()
+        assert age is None or age > 0
+        now = time.perf_counter()
+        start, origin = process_start(now)
+        assert start <= now
+        trace = StartupTrace(enabled=True, start=start, origin=origin)
+        trace.mark("phase")
+        stream = io.StringIO()
+        trace.report(stream)
+        assert f"ms since {origin}" in stream.getvalue()
+    
+    def test_input_interactive_before_history_load(self, chat_window):
+        """Test that history is loaded in a later event-loop pass than the input becoming interactive."""
+        window = chat_window
+        window.history_db.create_conversation("First")
+        window.trace = StartupTrace(enabled=True)
+        window._deferred_startup()
+        assert [phase for phase, _ in window.trace.phases] == ["input interactive"]
+        assert window.current_conversation_id is None
+        phases = lambda: [phase for phase, _ in window.trace.phases]
+        assert _process_events_until(lambda: "history loaded" in phases())
+        assert phases().index("input interactive") < phases().index("history loaded")
+        assert window.current_conversation_id is not None
+
+
+class TestDiagnostics:
+    """Test cases for the memory diagnostics helpers."""
+    
+    def test_metrics_log_appends_json_lines(self):
+        """Test that each record is one JSON line with its kind."""
+        import json
+        with tempfile.TemporaryDirectory() as tmp:
+            log = MetricsLog(os.path.join(tmp, "logs", "metrics.jsonl"))
+            log.write("memory", rss_mb=12.5)
+            log.write("heap_diff", top=[])
+            with open(log.path) as f:
+                records = [json.loads(line) for line in f]
+        assert [r["kind"] for r in records] == ["memory", "heap_diff"]
+        assert records[0]["rss_mb"] == 12.5
+    
+    def test_heap_diff_reports_new_allocations(self):
+        """Test that memory allocated between diffs shows up in the next diff."""
+        import tracemalloc
+        tracker = HeapTracker()
+        try:
+            retained = [bytearray(1024) for _ in range(1000)]
+            diff = tracker.diff(limit=5)
+            assert diff and diff[0]["size_diff"] >= 1000 * 1024
+            assert "test_dummy.py" in diff[0]["where"]
+            assert tracker.traced_bytes()["current"] > 0
+            del retained
+        finally:
+            tracemalloc.stop()
+    
+    def test_current_rss_and_available_memory(self):
+        """Test that the process RSS and available system memory can be read."""
+        rss = current_rss_bytes()
+        assert rss is None or rss > 0
+        available = available_memory_bytes()
+        assert available is None or available > 0
+
+
 def test_dummy():
     """Dummy test to ensure pytest is working."""
     assert True 
\ No newline at end of file
@@ -0,0 +1,105 @@
+from typing import List, Optional, Tuple
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from offline_gpt.database.history import ChatHistoryDB
+
+class ConversationListModel(QAbstractListModel):
+    """Sidebar model that pages conversations in from the database on demand.
+
+    Rows are (id, summary, created_at) tuples ordered newest first. Changes made
+    by the window are applied as row-level inserts, updates and removals rather
+    than by re-querying the whole table.
+    """
+
+    def __init__(self, history_db: ChatHistoryDB, page_size: int = 100, parent=None):
+        super().__init__(parent)
+        self.history_db = history_db
+        self.page_size = page_size
+        self._rows: List[Tuple[str, str, str]] = []
+        self._exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        convo_id, summary, _created_at = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return summary
+        if role == Qt.ItemDataRole.UserRole:
+            return convo_id
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        after = None
+        if self._rows:
+            last_id, _summary, last_created = self._rows[-1]
+            after = (last_created, last_id)
+        page = self.history_db.get_conversations_page(self.page_size, after)
+        if len(page) < self.page_size:
+            self._exhausted = True
+        if not page:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+    def reload(self):
+        """Drop all rows and fetch the first page again"""
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = True
+        self.endResetModel()
+
+    def row_of(self, conversation_id: str) -> int:
+        for row, (convo_id, _summary, _created_at) in enumerate(self._rows):
+            if convo_id == conversation_id:
+                return row
+        return -1
+
+    def conversation_id_at(self, row: int) -> Optional[str]:
+        if 0 <= row < len(self._rows):
+            return self._rows[row][0]
+        return None
+
+    def prepend_conversation(self, conversation_id: str):
+        """Insert a newly created conversation at the top of the list"""
+        row = self.history_db.get_conversation(conversation_id)
+        if row is None:
+            return
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._rows.insert(0, row)
+        self.endInsertRows()
+
+    def update_summary(self, conversation_id: str, summary: str):
+        row = self.row_of(conversation_id)
+        if row < 0:
+            return
+        convo_id, _summary, created_at = self._rows[row]
+        self._rows[row] = (convo_id, summary, created_at)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+
+    def remove_conversation(self, conversation_id: str):
+        row = self.row_of(conversation_id)
+        if row < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
@@ -1,33 +1,82 @@
 import os
 import sys
 import threading
+import time
 import logging
-import markdown
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLineEdit, QPushButton, QToolBar, QLabel, QScrollArea, QSizePolicy, QFrame, QMessageBox, QListWidget, QListWidgetItem, QSplitter, QMenu, QProgressBar, QTextEdit
+    QLineEdit, QPushButton, QToolBar, QLabel, QScrollArea, QSizePolicy, QFrame, QMessageBox, QListView, QSplitter, QMenu, QProgressBar, QTextEdit
 )
-from PySide6.QtCore import Qt, QDateTime, QTimer, Signal, QObject
-from PySide6.QtGui import QAction
+from PySide6.QtCore import Qt, QDateTime, QEvent, QTimer, Signal, QObject
+from PySide6.QtGui import QAction, QPainter, QPalette
+import shiboken6
 from offline_gpt.database.history import ChatHistoryDB
+from offline_gpt.database.store import ConversationStore
 from offline_gpt.backend.llm import LLMBackend
+from offline_gpt.backend.worker import LLMWorkerClient
+from offline_gpt.backend.prefill import SpeculativePrefiller
+from offline_gpt.backend.gguf import context_plan, describe_plan
+from offline_gpt.config import load_config
+from offline_gpt.diagnostics import MetricsLog, available_memory_bytes
+from offline_gpt.startup import StartupTrace
+from offline_gpt.ui.conversation_model import ConversationListModel
+from offline_gpt.ui.render import RenderPipeline, render_markdown
+from offline_gpt.ui.watchdog import MemoryWatchdog
+from offline_gpt.ui import theme
 
-# Setup structured logging
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../logs')
-os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, 'app.log')
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stderr)
-    ]
-)
+METRICS_FILE = os.path.join(LOG_DIR, 'metrics.jsonl')
 logger = logging.getLogger("offline-gpt")
 
+def _setup_logging():
+    """Setup structured logging (called from run_app, not at import time)"""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(name)s %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler(sys.stderr)
+        ]
+    )
+
 MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../models/Phi-3-mini-4k-instruct-q4.gguf')
 
+# Storage bar styles for each threshold band, built once
+STORAGE_BAR_STYLES = {
+    level: f"QProgressBar::chunk {{ background: {color}; }} QProgressBar {{ border-radius: 6px; background: #222; }}"
+    for level, color in (('green', '#4caf50'), ('yellow', '#ffc107'), ('red', '#f44336'))
+}
+
+# Time spent building the newest bubbles synchronously when a conversation
+# opens (at least one is always built); older ones are built as they near the view
+HISTORY_TAIL_SECONDS = 0.008
+# Time budget per event-loop pass for building older bubbles (about half a frame)
+HISTORY_CHUNK_SECONDS = 0.008
+# Bubbles of a closed conversation deleted per event-loop pass
+HISTORY_DELETE_PER_PASS = 4
+
+def _themed_label(text, font_kind, color_role):
+    """Label styled through shared fonts and palette roles instead of a stylesheet"""
+    label = QLabel(text)
+    label.setFont(theme.font(font_kind))
+    label.setForegroundRole(color_role)
+    return label
+
+class BubbleFrame(QWidget):
+    """Rounded message background, painted in the current theme's bubble color"""
+    def __init__(self, is_user=False):
+        super().__init__()
+        self.is_user = is_user
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(theme.color("user_bubble" if self.is_user else "llm_bubble"))
+        painter.drawRoundedRect(self.rect(), 10, 10)
+
 class LoadingBubble(QWidget):
     def __init__(self, parent_width=600):
         super().__init__()
@@ -36,32 +85,32 @@ class LoadingBubble(QWidget):
         outer_layout.setSpacing(2)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
 
-        sender_label = QLabel("LLM")
-        sender_label.setStyleSheet("font-weight: bold; color: #444;")
+        sender_label = _themed_label("LLM", "sender", QPalette.ColorRole.BrightText)
         outer_layout.addWidget(sender_label, alignment=Qt.AlignmentFlag.AlignLeft)
 
         # Message row with loading dots
         msg_row = QHBoxLayout()
         msg_row.setContentsMargins(0, 0, 0, 0)  # No margins in message row
-        loading_label = QLabel("Thinking")
-        loading_label.setWordWrap(True)
-        loading_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
+        bubble = BubbleFrame(is_user=False)
+        bubble.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
         # Match the chat bubble width - 98% of parent width
         bubble_width = int(parent_width * 0.98)
-        loading_label.setMaximumWidth(bubble_width)
-        loading_label.setMinimumWidth(250)
-        loading_label.setStyleSheet("background: #f1f1f1; border-radius: 10px; padding: 12px; color: #222; font-size: 14px;")
-        msg_row.addWidget(loading_label)
+        bubble.setMaximumWidth(bubble_width)
+        bubble.setMinimumWidth(250)
+        bubble_layout = QVBoxLayout(bubble)
+        bubble_layout.setContentsMargins(12, 12, 12, 12)
+        loading_label = _themed_label("Thinking", "message", QPalette.ColorRole.Text)
+        loading_label.setWordWrap(True)
+        bubble_layout.addWidget(loading_label)
+        msg_row.addWidget(bubble)
         msg_row.addStretch(1)
         outer_layout.addLayout(msg_row)
 
         # Add animated dots
-        self.dots_label = QLabel("...")
-        self.dots_label.setStyleSheet("font-size: 16px; color: #888;")
+        self.dots_label = _themed_label("...", "dots", QPalette.ColorRole.PlaceholderText)
         outer_layout.addWidget(self.dots_label, alignment=Qt.AlignmentFlag.AlignLeft)
 
-        ts_label = QLabel(QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm:ss"))
-        ts_label.setStyleSheet("font-size: 10px; color: #888;")
+        ts_label = _themed_label(QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm:ss"), "timestamp", QPalette.ColorRole.PlaceholderText)
         outer_layout.addWidget(ts_label, alignment=Qt.AlignmentFlag.AlignLeft)
 
         # Add a bottom border for separation
@@ -72,7 +121,7 @@ class LoadingBubble(QWidget):
 
         # Start dot animation
         self.dot_count = 0
-        self.timer = QTimer()
+        self.timer = QTimer(self)
         self.timer.timeout.connect(self._animate_dots)
         self.timer.start(500)  # Update every 500ms
 
@@ -84,15 +133,14 @@ class LoadingBubble(QWidget):
         self.timer.stop()
 
 class ChatBubble(QWidget):
-    def __init__(self, sender, message, timestamp, is_user=False, parent_width=600):
+    def __init__(self, sender, message, timestamp, is_user=False, parent_width=600, html=None, defer_render=False):
         super().__init__()
         outer_layout = QVBoxLayout(self)
         outer_layout.setContentsMargins(5, 3, 5, 3)  # Reduced margins
         outer_layout.setSpacing(2)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
 
-        sender_label = QLabel(sender)
-        sender_label.setStyleSheet("font-weight: bold; color: #0078d7;" if is_user else "font-weight: bold; color: #444;")
+        sender_label = _themed_label(sender, "sender", QPalette.ColorRole.Link if is_user else QPalette.ColorRole.BrightText)
         outer_layout.addWidget(sender_label, alignment=Qt.AlignmentFlag.AlignRight if is_user else Qt.AlignmentFlag.AlignLeft)
 
         # Message row with stretch for alignment
@@ -101,39 +149,47 @@ class ChatBubble(QWidget):
         if is_user:
             msg_row.addStretch(1)
         
+        # The bubble background is painted by BubbleFrame; the text edit on top is transparent
+        bubble = BubbleFrame(is_user)
+        bubble.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        bubble_layout = QVBoxLayout(bubble)
+        bubble_layout.setContentsMargins(8, 8, 8, 8)
+
         # Use QTextEdit for markdown rendering
-        msg_text = QTextEdit()
+        self.msg_text = msg_text = QTextEdit()
         msg_text.setReadOnly(True)
         msg_text.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         msg_text.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         msg_text.setFrameStyle(0)  # No frame
         msg_text.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        msg_text.setAutoFillBackground(False)
+        msg_text.viewport().setAutoFillBackground(False)
+        msg_text.setFont(theme.font("message"))
         
         # Increase bubble width to 98% of parent width for maximum text display
         bubble_width = int(parent_width * 0.98)
-        msg_text.setMaximumWidth(bubble_width)
-        msg_text.setMinimumWidth(250)  # Increased minimum width further
+        bubble.setMaximumWidth(bubble_width)
+        bubble.setMinimumWidth(250)  # Increased minimum width further
         
         # Set document width for proper text wrapping
         msg_text.document().setTextWidth(bubble_width - 16)  # Account for padding
         
-        # Set the content with markdown rendering
-        html_content = self._render_markdown(message)
-        msg_text.setHtml(html_content)
-        
-        # Style the text widget to look like a chat bubble
-        msg_text.setStyleSheet(
-            "QTextEdit { background: #e1f5fe; border-radius: 10px; padding: 8px; color: #222; font-size: 14px; border: none; }" if is_user else
-            "QTextEdit { background: #f1f1f1; border-radius: 10px; padding: 8px; color: #222; font-size: 14px; border: none; }"
-        )
+        # Set the content with markdown rendering; deferred bubbles show plain
+        # text until the render pipeline delivers their HTML via set_html
+        if html is not None:
+            msg_text.setHtml(html)
+        elif defer_render:
+            msg_text.setPlainText(message)
+        else:
+            msg_text.setHtml(render_markdown(message))
         
-        msg_row.addWidget(msg_text)
+        bubble_layout.addWidget(msg_text)
+        msg_row.addWidget(bubble)
         if not is_user:
             msg_row.addStretch(1)
         outer_layout.addLayout(msg_row)
 
-        ts_label = QLabel(timestamp)
-        ts_label.setStyleSheet("font-size: 10px; color: #888;")
+        ts_label = _themed_label(timestamp, "timestamp", QPalette.ColorRole.PlaceholderText)
         outer_layout.addWidget(ts_label, alignment=Qt.AlignmentFlag.AlignRight if is_user else Qt.AlignmentFlag.AlignLeft)
 
         # Add a bottom border for separation
@@ -142,127 +198,232 @@ class ChatBubble(QWidget):
         line.setFrameShadow(QFrame.Shadow.Sunken)
         outer_layout.addWidget(line)
 
-    def _render_markdown(self, text):
-        """Convert markdown text to HTML for display"""
-        try:
-            # Convert markdown to HTML
-            html = markdown.markdown(text, extensions=['fenced_code', 'codehilite', 'tables', 'nl2br'])
-            
-            # Add some basic CSS styling for better appearance
-            styled_html = f"""
-            <html>
-            <head>
-            <style>
-                body {{ 
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                    font-size: 14px;
-                    line-height: 1.4;
-                    margin: 0;
-                    padding: 0;
-                }}
-                code {{ 
-                    background-color: #f0f0f0; 
-                    padding: 2px 4px; 
-                    border-radius: 3px; 
-                    font-family: 'Monaco', 'Menlo', 'Ubuntu Mono', monospace;
-                    font-size: 13px;
-                }}
-                pre {{ 
-                    background-color: #f5f5f5; 
-                    padding: 8px; 
-                    border-radius: 5px; 
-                    overflow-x: auto;
-                    border-left: 3px solid #0078d7;
-                }}
-                pre code {{ 
-                    background-color: transparent; 
-                    padding: 0;
-                }}
-                blockquote {{ 
-                    border-left: 3px solid #ccc; 
-                    margin: 0; 
-                    padding-left: 10px; 
-                    color: #666;
-                }}
-                ul, ol {{ 
-                    margin: 8px 0; 
-                    padding-left: 20px;
-                }}
-                li {{ 
-                    margin: 2px 0;
-                }}
-                strong, b {{ 
-                    font-weight: bold; 
-                }}
-                em, i {{ 
-                    font-style: italic; 
-                }}
-                h1, h2, h3, h4, h5, h6 {{ 
-                    margin: 8px 0 4px 0; 
-                    font-weight: bold;
-                }}
-                h1 {{ font-size: 18px; }}
-                h2 {{ font-size: 16px; }}
-                h3 {{ font-size: 15px; }}
-                table {{ 
-                    border-collapse: collapse; 
-                    width: 100%; 
-                    margin: 8px 0;
-                }}
-                th, td {{ 
-                    border: 1px solid #ddd; 
-                    padding: 6px 8px; 
-                    text-align: left;
-                }}
-                th {{ 
-                    background-color: #f5f5f5; 
-                    font-weight: bold;
-                }}
-            </style>
-            </head>
-            <body>
-            {html}
-            </body>
-            </html>
-            """
-            return styled_html
-        except Exception as e:
-            # Fallback to plain text if markdown rendering fails
-            logger.warning(f"Markdown rendering failed: {e}")
-            return f"<p>{text}</p>"
+    def set_html(self, html):
+        """Replace the placeholder text once the rendered markdown arrives"""
+        self.msg_text.setHtml(html)
 
 class ChatWindow(QMainWindow):
     # Signal to handle LLM response in main thread
-    llm_response_ready = Signal(str, str, str, int)  # llm_response, user_msg, timestamp, parent_width
-    def __init__(self):
+    llm_response_ready = Signal(str, str, str, str, int)  # conversation_id, llm_response, user_msg, timestamp, parent_width
+    # Signals to report background model loading to the main thread
+    llm_loading = Signal(str)
+    llm_loaded = Signal()
+    llm_load_failed = Signal(str)
+    llm_reloaded = Signal(float)
+    llm_unloaded = Signal()
+    def __init__(self, trace=None, history_db=None, llm=None, diagnostics=False):
         super().__init__()
+        self.trace = trace or StartupTrace()
         self.setWindowTitle("Offline-GPT")
         self.resize(800, 700)
         self.dark_mode = False
-        db_path = os.path.join(os.path.expanduser("~"), ".offline_gpt_chat.db")
-        self.history_db = ChatHistoryDB(db_path, storage_limit_mb=100)
+        self.config = load_config()
+        # Opened on first use, so logs/ is only created once something is recorded
+        self._metrics = None
+        self._metrics_lock = threading.Lock()
+        # Memory sampling for long sessions (--diagnostics or diagnostics_enabled)
+        self.watchdog = None
+        if diagnostics or self.config["diagnostics_enabled"]:
+            self.watchdog = MemoryWatchdog(
+                self._metrics_log(),
+                interval_seconds=self.config["diagnostics_interval_seconds"],
+                growth_warning_mb=self.config["diagnostics_growth_warning_mb"],
+                parent=self,
+            )
+            self.watchdog.growth_warning.connect(lambda message: self.statusBar().showMessage(message, 30000))
+        if history_db is None:
+            db_path = os.path.join(os.path.expanduser("~"), ".offline_gpt_chat.db")
+            history_db = ChatHistoryDB(db_path, storage_limit_mb=self.config["chat_history_storage_limit_mb"])
+        self.history_db = history_db
+        # A backend passed in (e.g. by the benchmark harness) is used instead of loading the model
+        self._provided_llm = llm
+        # Source of messages for both the view and prompts; writes go to SQLite behind it
+        self.store = ConversationStore(self.history_db)
         self.llm = None
-        self._load_llm_backend()
+        # Set once the background model load has finished (successfully or not)
+        self._llm_ready = threading.Event()
+        # Prefills the KV cache while the user types (created once the model is loaded)
+        self.prefiller = None
+        self.prefill_timer = QTimer(self)
+        self.prefill_timer.setSingleShot(True)
+        self.prefill_timer.setInterval(400)  # Debounce keystrokes
+        self.prefill_timer.timeout.connect(self._prefill_draft)
+        # Releases the model when idle or short of memory; it reloads on focus or send
+        self._last_activity = time.monotonic()
+        self._pending_replies = 0
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setInterval(30 * 1000)
+        self.idle_timer.timeout.connect(self._check_idle)
+        # Off-thread markdown rendering for history
+        self.render_pipeline = RenderPipeline(self)
+        self.render_pipeline.rendered.connect(self._on_message_rendered)
+        self._history_generation = 0
+        self._history_messages = []
+        self._history_bubbles = []
+        self._history_html = {}
+        self._history_unrendered = set()
+        self._history_next_older = 0
+        self._history_fill_pending = False
+        self._history_width = 600
+        # Running estimate of the time one history bubble takes to build
+        self._bubble_seconds = HISTORY_CHUNK_SECONDS / 4
+        self._bubble_count = 0
         self.current_conversation_id = None
+        self.loading_bubble = None
         self.sidebar_expanded = False
+        self._first_frame_shown = False
         self._init_ui()
         self._apply_theme()
-        self._load_conversations()
         # Auto-focus the input field
         self.input_box.setFocus()
+        self.input_box.installEventFilter(self)
         
         # Connect the signal to the slot
         self.llm_response_ready.connect(self._handle_llm_response)
+        self.llm_loading.connect(self.statusBar().showMessage)
+        self.llm_loaded.connect(self._on_llm_loaded)
+        self.llm_load_failed.connect(self._on_llm_load_failed)
+        self.llm_reloaded.connect(self._on_llm_reloaded)
+        self.llm_unloaded.connect(self._reset_memory_baseline)
         
+        self.trace.mark("window constructed")
         logger.info("App started and UI initialized.")
 
+    def _metrics_log(self):
+        """The metrics log, opened on first use (also called from the model threads)"""
+        with self._metrics_lock:
+            if self._metrics is None:
+                self._metrics = MetricsLog(METRICS_FILE)
+            return self._metrics
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_frame_shown:
+            # History and the model are only loaded once the first frame is on screen
+            self._first_frame_shown = True
+            self.trace.mark("first frame painted")
+            QTimer.singleShot(0, self._deferred_startup)
+
+    def _deferred_startup(self):
+        self.input_box.setFocus()
+        threading.Thread(target=self._load_llm_backend, daemon=True).start()
+        self.trace.mark("input interactive")
+        # History loads in a later pass, after the event loop has had a turn
+        QTimer.singleShot(0, self._load_startup_history)
+
+    def _load_startup_history(self):
+        self._load_conversations()
+        self.trace.mark("history loaded")
+
     def _load_llm_backend(self):
+        """Load the model off the UI thread and report back through signals"""
         try:
-            self.llm = LLMBackend(os.path.abspath(MODEL_PATH))
+            if self._provided_llm is not None:
+                self.llm = self._provided_llm
+            else:
+                model_path = os.path.abspath(MODEL_PATH)
+                kv_cache_type = self.config["kv_cache_type"]
+                # Show the memory the KV cache will take before committing to it
+                plan = context_plan(model_path, self.config["context_length"], kv_cache_type)
+                self.llm_loading.emit(f"Loading model: {describe_plan(plan)}")
+                if self.config["llm_worker_process"]:
+                    self.llm = LLMWorkerClient(model_path, context_length=plan["n_ctx"], kv_cache_type=kv_cache_type)
+                else:
+                    self.llm = LLMBackend(model_path, context_length=plan["n_ctx"], kv_cache_type=kv_cache_type)
         except Exception as e:
             logger.error(f"Failed to load LLM model: {e}")
-            QMessageBox.critical(self, "LLM Load Error", f"Failed to load LLM model: {e}")
             self.llm = None
+            self._llm_ready.set()
+            self.llm_load_failed.emit(str(e))
+            return
+        self._llm_ready.set()
+        self.llm_loaded.emit()
+
+    def _on_llm_loaded(self):
+        self.statusBar().clearMessage()
+        self.trace.mark("model loaded")
+        self.trace.report()
+        self._reset_memory_baseline()
+        if self.config["speculative_prefill"] and self.llm:
+            self.prefiller = SpeculativePrefiller(self.llm)
+            self._prefill_history()
+        if self.llm and self._provided_llm is None:
+            self.idle_timer.start()
+
+    def eventFilter(self, obj, event):
+        if obj is self.input_box and event.type() == QEvent.Type.FocusIn:
+            # Returning to the window after a long break: get the model back before Enter
+            self._last_activity = time.monotonic()
+            if self.llm and self._llm_ready.is_set() and not self.llm.loaded:
+                threading.Thread(target=self._reload_llm, args=("focus",), daemon=True).start()
+        return super().eventFilter(obj, event)
+
+    def _check_idle(self):
+        """Release the model after a long idle period, or sooner when system memory runs low"""
+        if not self.llm or not self.llm.loaded or self._pending_replies:
+            return
+        idle_seconds = time.monotonic() - self._last_activity
+        idle_minutes = self.config["idle_unload_minutes"]
+        threshold_mb = self.config["unload_below_available_mb"]
+        reason = None
+        if idle_minutes and idle_seconds >= idle_minutes * 60:
+            reason = "idle"
+        elif threshold_mb and idle_seconds >= 60:
+            available = available_memory_bytes()
+            if available is not None and available < threshold_mb * 1024 * 1024:
+                reason = "memory pressure"
+        if reason:
+            logger.info(f"Unloading LLM model ({reason}, idle for {idle_seconds:.0f}s)")
+            self._metrics_log().write("model_unload", reason=reason, idle_seconds=round(idle_seconds))
+            threading.Thread(target=self._unload_llm, daemon=True).start()
+
+    def _unload_llm(self):
+        """Release the model (runs off the UI thread)"""
+        self.llm.unload()
+        self.llm_unloaded.emit()
+
+    def _reload_llm(self, reason):
+        """Reload an unloaded model (runs off the UI thread) and record how long it took"""
+        try:
+            seconds = self.llm.ensure_loaded()
+        except Exception as e:
+            logger.error(f"Failed to reload LLM model: {e}")
+            return
+        if seconds is not None:
+            self._metrics_log().write("model_reload", reason=reason, seconds=round(seconds, 3))
+            self.llm_reloaded.emit(seconds)
+
+    def _on_llm_reloaded(self, seconds):
+        self.statusBar().showMessage(f"Model reloaded in {seconds:.1f}s", 5000)
+        self._reset_memory_baseline()
+        self._prefill_history()
+
+    def _reset_memory_baseline(self):
+        # Loading or releasing the model moves RSS by its size; growth warnings
+        # are about what happens after that
+        if self.watchdog:
+            self.watchdog.reset_baseline()
+
+    def _prefill_history(self):
+        """Start evaluating the current conversation so the next send only evaluates the new message"""
+        if self.prefiller and self.current_conversation_id:
+            self.prefiller.submit(self.store.get_messages(self.current_conversation_id))
+
+    def _on_input_edited(self, _text):
+        self._last_activity = time.monotonic()
+        if self.prefiller:
+            self.prefill_timer.start()
+
+    def _prefill_draft(self):
+        draft = self.input_box.text().strip()
+        if self.prefiller and self.current_conversation_id:
+            self.prefiller.submit(self.store.get_messages(self.current_conversation_id), draft or None)
+
+    def _on_llm_load_failed(self, error):
+        self.statusBar().clearMessage()
+        self.trace.mark("model load failed")
+        self.trace.report()
+        QMessageBox.critical(self, "LLM Load Error", f"Failed to load LLM model: {error}")
 
     def _init_ui(self):
         central = QWidget()
@@ -284,9 +445,12 @@ class ChatWindow(QMainWindow):
         self.sidebar_btn.clicked.connect(self.toggle_sidebar)
         self.sidebar_layout.addWidget(self.sidebar_btn, alignment=Qt.AlignmentFlag.AlignTop)
         # Scrollable chat list
-        self.convo_list = QListWidget()
+        self.convo_model = ConversationListModel(self.history_db, parent=self)
+        self.convo_list = QListView()
+        self.convo_list.setModel(self.convo_model)
+        self.convo_list.setUniformItemSizes(True)
         self.convo_list.setVisible(False)
-        self.convo_list.itemClicked.connect(self.select_conversation)
+        self.convo_list.clicked.connect(self.select_conversation)
         self.convo_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.convo_list.customContextMenuRequested.connect(self.show_conversation_context_menu)
         self.convo_scroll = QScrollArea()
@@ -307,18 +471,18 @@ class ChatWindow(QMainWindow):
         self.storage_bar.setTextVisible(False)
         self.storage_bar.setFixedHeight(16)
         self.storage_bar_label_row = QHBoxLayout()
+        self._storage_bar_level = None
         self.storage_bar_percent = QLabel()
-        self.storage_bar_percent.setStyleSheet("font-size: 12px; font-weight: bold;")
+        self.storage_bar_percent.setFont(theme.font("label"))
         self.storage_bar_label_row.addStretch(1)
         self.storage_bar_label_row.addWidget(self.storage_bar_percent)
         self.sidebar_bottom_layout.addLayout(self.storage_bar_label_row)
         self.sidebar_bottom_layout.addWidget(self.storage_bar)
-        self.storage_bar_mb = QLabel()
-        self.storage_bar_mb.setStyleSheet("font-size: 11px; color: #888;")
+        self.storage_bar_mb = _themed_label("", "small", QPalette.ColorRole.PlaceholderText)
         self.sidebar_bottom_layout.addWidget(self.storage_bar_mb)
         # Delete all button
         self.delete_all_btn = QPushButton("Delete All")
-        self.delete_all_btn.setStyleSheet("background: #f44336; color: #fff; font-weight: bold; border-radius: 6px; padding: 4px 0;")
+        self.delete_all_btn.setFont(theme.font("label"))
         self.delete_all_btn.clicked.connect(self.delete_all_conversations)
         self.sidebar_bottom_layout.addWidget(self.delete_all_btn)
         self.sidebar_layout.addWidget(self.sidebar_bottom)
@@ -334,16 +498,25 @@ class ChatWindow(QMainWindow):
 
         self.scroll_area = QScrollArea()
         self.scroll_area.setWidgetResizable(True)
-        self.chat_container = QWidget()
-        self.chat_layout = QVBoxLayout(self.chat_container)
-        self.chat_layout.addStretch(1)
-        self.scroll_area.setWidget(self.chat_container)
+        # Each conversation's bubbles live in their own container inside this
+        # host, so switching can hide one container instead of emptying it
+        self.chat_host = QWidget()
+        self.chat_host_layout = QVBoxLayout(self.chat_host)
+        self.chat_host_layout.setContentsMargins(0, 0, 0, 0)
+        self.scroll_area.setWidget(self.chat_host)
+        self._discarded_containers = []
+        self._discarded_bubbles = []
+        self._new_chat_container()
         chat_layout.addWidget(self.scroll_area)
+        self._scroll_from_bottom = 0
+        self.scroll_area.verticalScrollBar().rangeChanged.connect(self._on_scroll_range_changed)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self._on_scroll_value_changed)
 
         input_layout = QHBoxLayout()
         self.input_box = QLineEdit()
         self.input_box.setPlaceholderText("Type your message...")
         self.input_box.returnPressed.connect(self.send_message)
+        self.input_box.textEdited.connect(self._on_input_edited)
         input_layout.addWidget(self.input_box)
         self.send_btn = QPushButton("Send")
         self.send_btn.clicked.connect(self.send_message)
@@ -358,6 +531,10 @@ class ChatWindow(QMainWindow):
         self.clear_action = QAction("Clear Chat", self)
         self.clear_action.triggered.connect(self.clear_chat)
         toolbar.addAction(self.clear_action)
+        if self.watchdog:
+            self.heap_diff_action = QAction("Heap Snapshot Diff", self)
+            self.heap_diff_action.triggered.connect(self.show_heap_diff)
+            toolbar.addAction(self.heap_diff_action)
 
         main_layout.addWidget(self.chat_area)
 
@@ -376,19 +553,16 @@ class ChatWindow(QMainWindow):
         self._update_storage_bar()  # Always update storage bar when toggling sidebar
 
     def _load_conversations(self):
-        self.convo_list.clear()
-        conversations = self.history_db.get_conversations()
-        for convo_id, summary in conversations:
-            item = QListWidgetItem(summary)
-            item.setData(Qt.ItemDataRole.UserRole, convo_id)
-            self.convo_list.addItem(item)
+        # Only the first page is queried here; the view fetches more as it scrolls
+        self.convo_model.reload()
         # Auto-select the first conversation if none selected
-        if conversations and not self.current_conversation_id:
-            self.current_conversation_id = conversations[0][0]
+        first_id = self.convo_model.conversation_id_at(0)
+        if first_id and not self.current_conversation_id:
+            self.current_conversation_id = first_id
             self._load_history()
 
-    def select_conversation(self, item):
-        convo_id = item.data(Qt.ItemDataRole.UserRole)
+    def select_conversation(self, index):
+        convo_id = index.data(Qt.ItemDataRole.UserRole)
         self.current_conversation_id = convo_id
         self._load_history()
         self.toggle_sidebar()
@@ -398,7 +572,7 @@ class ChatWindow(QMainWindow):
         summary = "New Conversation"
         convo_id = self.history_db.create_conversation(summary)
         self.current_conversation_id = convo_id
-        self._load_conversations()
+        self.convo_model.prepend_conversation(convo_id)
         self._load_history()
         self.toggle_sidebar()
         self.input_box.setFocus() # Auto-focus input field
@@ -418,30 +592,170 @@ class ChatWindow(QMainWindow):
         # Update the conversation summary in the database
         self.history_db.update_conversation_summary(self.current_conversation_id, summary)
         
-        # Refresh the conversation list
-        self._load_conversations()
+        # Update just this row in the conversation list
+        self.convo_model.update_summary(self.current_conversation_id, summary)
 
     def _load_history(self):
-        # Clear UI
-        for i in reversed(range(self.chat_layout.count() - 1)):
-            widget = self.chat_layout.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
+        # Clear UI (also cancels any previous conversation still loading)
+        self._clear_chat_area()
         if not self.current_conversation_id:
             return
-        history = self.history_db.get_history(self.current_conversation_id)
-        parent_width = self.scroll_area.viewport().width()
-        for row in history:
-            _id, _convo_id, timestamp, user_msg, llm_resp = row
-            if user_msg:
-                self._add_bubble_from_history("You", user_msg, timestamp, True, parent_width)
-            if llm_resp:
-                self._add_bubble_from_history("LLM", llm_resp, timestamp, False, parent_width)
+        messages = self.store.get_messages(self.current_conversation_id)
+        self._history_messages = messages
+        self._history_bubbles = [None] * len(messages)
+        self._history_html = {}
+        self._history_unrendered = set(range(len(messages)))
+        self._history_width = self.scroll_area.viewport().width()
+        # Markdown is rendered on the pool, newest messages first
+        self._history_generation = self.render_pipeline.start([m["content"] for m in messages])
+        # Bubbles for the visible tail now, older ones as they come near the view
+        self._history_next_older = len(messages)
+        self._insert_history_bubbles(self.chat_layout, HISTORY_TAIL_SECONDS)
         self._scroll_to_bottom()
+        self._schedule_older_bubbles()
+        self._prefill_history()
+
+    def _history_bubble(self, index):
+        message = self._history_messages[index]
+        is_user = message["role"] == "user"
+        bubble = ChatBubble("You" if is_user else "LLM", message["content"], message["timestamp"], is_user, self._history_width,
+                            html=self._history_html.pop(index, None), defer_render=True)
+        self._history_bubbles[index] = bubble
+        self._bubble_count += 1
+        return bubble
+
+    def _insert_history_bubbles(self, layout, budget):
+        """Prepend older history bubbles to layout, stopping before the next one would overrun budget.
+
+        At least one bubble is built. A single bubble costs about as much as
+        the whole budget, so the check uses a running estimate of that cost
+        rather than only the time already spent.
+        """
+        start = time.perf_counter()
+        while self._history_next_older > 0:
+            bubble_start = time.perf_counter()
+            self._history_next_older -= 1
+            layout.insertWidget(0, self._history_bubble(self._history_next_older))
+            # Lay the bubble out now so its cost is counted in this pass
+            layout.activate()
+            now = time.perf_counter()
+            self._bubble_seconds += (now - bubble_start - self._bubble_seconds) / 4
+            if now - start + self._bubble_seconds > budget:
+                break
+
+    def _older_bubbles_needed(self):
+        """True while older bubbles remain and the top of the built ones is within a screen of the view"""
+        return self._history_next_older > 0 and self.scroll_area.verticalScrollBar().value() <= self.scroll_area.viewport().height()
+
+    def _schedule_older_bubbles(self):
+        if self._history_fill_pending or not self._older_bubbles_needed():
+            return
+        self._history_fill_pending = True
+        generation = self._history_generation
+        QTimer.singleShot(0, lambda: self._build_older_bubbles(generation))
 
-    def _add_bubble_from_history(self, sender, message, timestamp, is_user, parent_width):
-        bubble = ChatBubble(sender, message, timestamp, is_user, parent_width)
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, bubble)
+    def _build_older_bubbles(self, generation):
+        """Prepend one pass's worth of older history bubbles if the view is near them"""
+        if generation != self._history_generation:
+            return
+        self._history_fill_pending = False
+        if not self._older_bubbles_needed():
+            # Scrolling back up schedules the next pass
+            return
+        # Each pass's bubbles go into one page widget, so prepending moves a
+        # handful of pages in the chat layout rather than every bubble
+        page = QWidget()
+        page_layout = QVBoxLayout(page)
+        page_layout.setContentsMargins(0, 0, 0, 0)
+        self._insert_history_bubbles(page_layout, HISTORY_CHUNK_SECONDS)
+        self.chat_layout.insertWidget(0, page)
+        # Checked again next pass, once the scroll range includes the new page
+        if self._history_next_older > 0:
+            self._history_fill_pending = True
+            QTimer.singleShot(0, lambda: self._build_older_bubbles(generation))
+
+    def _on_message_rendered(self, generation, index, html):
+        if generation != self._history_generation:
+            return
+        self._history_unrendered.discard(index)
+        bubble = self._history_bubbles[index]
+        if bubble is not None:
+            bubble.set_html(html)
+        else:
+            # Picked up when the bubble is built
+            self._history_html[index] = html
+
+    def history_loaded(self):
+        """True once the bubbles in and near the view are built and every message is rendered"""
+        return not self._history_fill_pending and not self._history_unrendered
+
+    def _clear_chat_area(self):
+        self._history_generation = self.render_pipeline.cancel()
+        self._history_messages = []
+        self._history_bubbles = []
+        self._history_html = {}
+        self._history_unrendered = set()
+        self._history_next_older = 0
+        self._history_fill_pending = False
+        self._bubble_count = 0
+        # A reply may still be pending; forget its loading bubble before it is deleted
+        if self.loading_bubble:
+            self.loading_bubble.stop_animation()
+            self.loading_bubble = None
+        # Swap in an empty container rather than removing bubbles one by one.
+        # Hiding or reparenting the old one would visit every bubble, so it is
+        # shrunk to nothing (with its layout off, so the bubbles are not
+        # touched) and deleted a few bubbles per event-loop pass
+        old_container = self.chat_container
+        old_container.layout().setEnabled(False)
+        old_container.setGeometry(0, 0, 0, 0)
+        self.chat_host_layout.removeWidget(old_container)
+        self._discarded_containers.append(old_container)
+        if len(self._discarded_containers) == 1 and not self._discarded_bubbles:
+            QTimer.singleShot(0, self._delete_discarded_bubbles)
+        self._new_chat_container()
+
+    def _new_chat_container(self):
+        self.chat_container = QWidget(self.chat_host)
+        self.chat_layout = QVBoxLayout(self.chat_container)
+        # Grow the container as soon as bubbles are added; otherwise the layout
+        # first squeezes (and re-lays out the text of) every bubble to fit
+        self.chat_layout.setSizeConstraint(QVBoxLayout.SizeConstraint.SetMinimumSize)
+        self.chat_layout.addStretch(1)
+        self.chat_host_layout.addWidget(self.chat_container)
+
+    def _delete_discarded_bubbles(self):
+        """Delete a few cleared bubbles, then yield to the event loop"""
+        for _ in range(HISTORY_DELETE_PER_PASS):
+            if not self._discarded_bubbles:
+                if not self._discarded_containers:
+                    return
+                self._discarded_bubbles = self._discard_order(self._discarded_containers.pop(0))
+            shiboken6.delete(self._discarded_bubbles.pop(0))
+        QTimer.singleShot(0, self._delete_discarded_bubbles)
+
+    def _discard_order(self, container):
+        """The widgets of a cleared container in deletion order: bubbles, their emptied pages, then the container"""
+        widgets = []
+        for child in container.findChildren(QWidget, options=Qt.FindChildOption.FindDirectChildrenOnly):
+            if not isinstance(child, (ChatBubble, LoadingBubble)):
+                # A page of older bubbles; with its layout off, removing one
+                # does not re-lay out the rest
+                child.layout().setEnabled(False)
+                widgets.extend(child.findChildren(ChatBubble, options=Qt.FindChildOption.FindDirectChildrenOnly))
+            widgets.append(child)
+        widgets.append(container)
+        return widgets
+
+    def _on_scroll_range_changed(self, _minimum, maximum):
+        # Keep the same distance from the bottom when content is added or
+        # prepended, so the view stays pinned to the newest message
+        self.scroll_area.verticalScrollBar().setValue(maximum - self._scroll_from_bottom)
+        self._schedule_older_bubbles()
+
+    def _on_scroll_value_changed(self, value):
+        self._scroll_from_bottom = self.scroll_area.verticalScrollBar().maximum() - value
+        self._schedule_older_bubbles()
 
     def delete_all_conversations(self):
         reply = QMessageBox.question(
@@ -454,14 +768,11 @@ class ChatWindow(QMainWindow):
             logger.info("Deleting all conversations and chat history")
             # Delete all from DB
             for convo_id, _ in self.history_db.get_conversations():
-                self.history_db.delete_conversation(convo_id)
+                self.store.delete_conversation(convo_id)
             # Remove all from UI
-            self.convo_list.clear()
+            self.convo_model.clear()
             self.current_conversation_id = None
-            for i in reversed(range(self.chat_layout.count() - 1)):
-                widget = self.chat_layout.itemAt(i).widget()
-                if widget:
-                    widget.setParent(None)
+            self._clear_chat_area()
             self._scroll_to_bottom()
             self._update_storage_bar()
 
@@ -469,52 +780,61 @@ class ChatWindow(QMainWindow):
         user_msg = self.input_box.text().strip()
         if not user_msg or not self.current_conversation_id:
             return
+        conversation_id = self.current_conversation_id
+        self._last_activity = time.monotonic()
+        self._pending_replies += 1
+        # Prompt context comes from the in-memory store, not a database read
+        conversation = self.store.get_messages(conversation_id)
+        is_first_message = not conversation
         timestamp = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm:ss")
         parent_width = self.scroll_area.viewport().width()
         self.add_chat_bubble("You", user_msg, is_user=True, timestamp=timestamp, parent_width=parent_width)
         self.input_box.clear()
         # Update conversation summary on first message
-        if self.chat_layout.count() == 2:  # Only user message + stretch widget
+        if is_first_message:
             self._update_conversation_summary(user_msg)
         # Add loading bubble
         self.loading_bubble = LoadingBubble(parent_width)
         self.chat_layout.insertWidget(self.chat_layout.count() - 1, self.loading_bubble)
         self._scroll_to_bottom()
         # Call LLM in a background thread, passing full conversation history
-        history = self.history_db.get_history(self.current_conversation_id)
-        conversation = []
-        for row in history:
-            _id, _convo_id, timestamp, user_msg_h, llm_resp = row
-            if user_msg_h:
-                conversation.append({"role": "user", "content": user_msg_h})
-            if llm_resp:
-                conversation.append({"role": "assistant", "content": llm_resp})
-        # Add the new user message
         conversation.append({"role": "user", "content": user_msg})
-        threading.Thread(target=self._get_llm_and_display, args=(user_msg, timestamp, parent_width, conversation), daemon=True).start()
+        threading.Thread(target=self._get_llm_and_display, args=(conversation_id, user_msg, timestamp, parent_width, conversation), daemon=True).start()
 
-    def _get_llm_and_display(self, user_msg, timestamp, parent_width, conversation):
+    def _get_llm_and_display(self, conversation_id, user_msg, timestamp, parent_width, conversation):
+        # Messages sent while the model is still loading wait for it here
+        self._llm_ready.wait()
         if not self.llm:
             llm_response = "[LLM not available]"
         else:
-            llm_response = self.llm.chat(user_msg, conversation=conversation)
+            self._reload_llm("send")
+            try:
+                llm_response = self.llm.chat(user_msg, conversation=conversation)
+            except Exception as e:
+                llm_response = f"[LLM error: {e}]"
         logger.info(f"LLM thread completed, emitting signal with response: {llm_response[:50]}...")
-        self.llm_response_ready.emit(llm_response, user_msg, timestamp, parent_width)
+        self.llm_response_ready.emit(conversation_id, llm_response, user_msg, timestamp, parent_width)
 
-    def _handle_llm_response(self, llm_response, user_msg, timestamp, parent_width):
+    def _handle_llm_response(self, conversation_id, llm_response, user_msg, timestamp, parent_width):
         """Handle LLM response in the main thread"""
         logger.info(f"Signal received, adding LLM response to UI: {llm_response[:100]}...")
+        self._pending_replies -= 1
+        
+        # Record the exchange against the conversation it was sent from before
+        # touching any widgets, so it is kept whatever the UI has done meanwhile
+        self.store.append_exchange(conversation_id, user_msg, llm_response)
         
         # Remove loading bubble
-        if hasattr(self, 'loading_bubble') and self.loading_bubble:
+        if self.loading_bubble:
             self.loading_bubble.stop_animation()
             self.loading_bubble.setParent(None)
+            self.loading_bubble.deleteLater()
             self.loading_bubble = None
         
-        # Add the actual response
-        self.add_chat_bubble("LLM", llm_response, is_user=False, timestamp=timestamp, parent_width=parent_width)
-        if self.current_conversation_id:
-            self.history_db.add_message(self.current_conversation_id, user_msg, llm_response)
+        # Only show the reply if its conversation is still open
+        if conversation_id == self.current_conversation_id:
+            self.add_chat_bubble("LLM", llm_response, is_user=False, timestamp=timestamp, parent_width=parent_width)
+            self._prefill_history()
         # Check storage limit
         if os.path.exists(self.history_db.db_path):
             size_mb = os.path.getsize(self.history_db.db_path) / (1024 * 1024)
@@ -531,8 +851,9 @@ class ChatWindow(QMainWindow):
         logger.info(f"Creating chat bubble for {sender}: {message[:50]}...")
         bubble = ChatBubble(sender, message, timestamp, is_user, parent_width)
         self.chat_layout.insertWidget(self.chat_layout.count() - 1, bubble)
+        self._bubble_count += 1
         self._scroll_to_bottom()
-        logger.info(f"Chat bubble added, total bubbles: {self.chat_layout.count() - 1}")
+        logger.info(f"Chat bubble added, total bubbles: {self._bubble_count}")
 
     def _scroll_to_bottom(self):
         self.scroll_area.verticalScrollBar().setValue(self.scroll_area.verticalScrollBar().maximum())
@@ -542,16 +863,16 @@ class ChatWindow(QMainWindow):
         self._apply_theme()
 
     def _apply_theme(self):
-        if self.dark_mode:
-            self.setStyleSheet("""
-                QMainWindow { background: #232629; }
-                QLineEdit { background: #2b2b2b; color: #f0f0f0; }
-                QPushButton { background: #444; color: #fff; }
-                QLabel { color: #f0f0f0; }
-                QScrollArea { background: #232629; }
-            """)
-        else:
-            self.setStyleSheet("")
+        # One application palette change; bubbles repaint with the new theme
+        # colors without any stylesheet being re-polished
+        theme.apply_theme("dark" if self.dark_mode else "light")
+        self.delete_all_btn.setPalette(self._danger_palette())
+
+    def _danger_palette(self):
+        palette = QPalette(self.delete_all_btn.palette())
+        palette.setColor(QPalette.ColorRole.Button, theme.color("danger"))
+        palette.setColor(QPalette.ColorRole.ButtonText, theme.color("danger_text"))
+        return palette
 
     def clear_chat(self):
         if not self.current_conversation_id:
@@ -564,38 +885,35 @@ class ChatWindow(QMainWindow):
         )
         if reply == QMessageBox.StandardButton.Yes:
             logger.info(f"Clearing chat for conversation {self.current_conversation_id}")
-            self.history_db.clear_history(self.current_conversation_id)
+            self.store.clear_conversation(self.current_conversation_id)
             # Clear chat bubbles from UI
-            for i in reversed(range(self.chat_layout.count() - 1)):
-                widget = self.chat_layout.itemAt(i).widget()
-                if widget:
-                    widget.setParent(None)
+            self._clear_chat_area()
             self._scroll_to_bottom()
             # Remove conversation from list
-            for i in range(self.convo_list.count()):
-                item = self.convo_list.item(i)
-                if item.data(Qt.ItemDataRole.UserRole) == self.current_conversation_id:
-                    self.convo_list.takeItem(i)
-                    break
+            self.convo_model.remove_conversation(self.current_conversation_id)
             self._update_storage_bar() # Update storage bar after clearing chat
 
     def show_conversation_context_menu(self, position):
         """Show context menu for conversation list"""
-        item = self.convo_list.itemAt(position)
-        if not item:
+        index = self.convo_list.indexAt(position)
+        if not index.isValid():
             return
         
+        # Capture the id, not the index: rows may be inserted or removed while the menu is open
+        convo_id = index.data(Qt.ItemDataRole.UserRole)
         menu = QMenu()
         delete_action = menu.addAction("Delete Conversation")
-        delete_action.triggered.connect(lambda: self.delete_conversation(item))
+        delete_action.triggered.connect(lambda: self.delete_conversation(convo_id))
         
         # Show menu at cursor position
         menu.exec(self.convo_list.mapToGlobal(position))
 
-    def delete_conversation(self, item):
+    def delete_conversation(self, convo_id):
         """Delete a conversation from the list and database"""
-        convo_id = item.data(Qt.ItemDataRole.UserRole)
-        summary = item.text()
+        row = self.convo_model.row_of(convo_id)
+        if row < 0:
+            return
+        summary = self.convo_model.index(row).data(Qt.ItemDataRole.DisplayRole)
         
         reply = QMessageBox.question(
             self,
@@ -608,22 +926,38 @@ class ChatWindow(QMainWindow):
             logger.info(f"Deleting conversation {convo_id}: {summary}")
             
             # Delete from database
-            self.history_db.delete_conversation(convo_id)
+            self.store.delete_conversation(convo_id)
             
             # Remove from list
-            self.convo_list.takeItem(self.convo_list.row(item))
+            self.convo_model.remove_conversation(convo_id)
             
             # If this was the current conversation, clear the chat area
             if convo_id == self.current_conversation_id:
                 self.current_conversation_id = None
                 # Clear chat bubbles from UI
-                for i in reversed(range(self.chat_layout.count() - 1)):
-                    widget = self.chat_layout.itemAt(i).widget()
-                    if widget:
-                        widget.setParent(None)
+                self._clear_chat_area()
                 self._scroll_to_bottom()
             self._update_storage_bar() # Update storage bar after deleting conversation
 
+    def show_heap_diff(self):
+        """Show which Python allocations grew since the last snapshot diff"""
+        self.watchdog.sample()
+        box = QMessageBox(self)
+        box.setWindowTitle("Heap Snapshot Diff")
+        box.setText("Python heap changes since the previous snapshot (also written to the metrics log).")
+        box.setDetailedText(self.watchdog.heap_snapshot_diff())
+        box.exec()
+
+    def closeEvent(self, event):
+        # Persist any exchanges still waiting in the write-behind queue
+        self.store.close()
+        self.render_pipeline.shutdown()
+        if self.prefiller:
+            self.prefiller.close()
+        if isinstance(self.llm, LLMWorkerClient):
+            self.llm.close()
+        super().closeEvent(event)
+
     def _update_storage_bar(self):
         db_path = self.history_db.db_path
         logger.info(f"Checking storage for database: {db_path}")
@@ -635,20 +969,29 @@ class ChatWindow(QMainWindow):
         self.storage_bar.setValue(percent)
         # Color thresholds
         if percent < 50:
-            color = '#4caf50'  # green
+            level = 'green'
         elif percent < 75:
-            color = '#ffc107'  # yellow
+            level = 'yellow'
         else:
-            color = '#f44336'  # red
-        self.storage_bar.setStyleSheet(f"QProgressBar::chunk {{ background: {color}; }} QProgressBar {{ border-radius: 6px; background: #222; }}")
+            level = 'red'
+        # Only restyle when the threshold band actually changes
+        if level != self._storage_bar_level:
+            self._storage_bar_level = level
+            self.storage_bar.setStyleSheet(STORAGE_BAR_STYLES[level])
         self.storage_bar_percent.setText(f"{percent}%")
         self.storage_bar_mb.setText(f"{used_mb:.1f} MB / {limit_mb} MB")
 
     # Call self._update_storage_bar() after any action that changes storage
     # Add calls to _update_storage_bar in send_message, clear_chat, delete_conversation, and toggle_sidebar
 
-def run_app():
+def run_app(trace=None, diagnostics=False):
+    trace = trace or StartupTrace()
+    _setup_logging()
     app = QApplication(sys.argv)
-    window = ChatWindow()
+    # Fusion draws entirely from the palette, so themes look the same on every platform
+    app.setStyle("Fusion")
+    trace.mark("QApplication created")
+    window = ChatWindow(trace=trace, diagnostics=diagnostics)
     window.show()
-    sys.exit(app.exec()) 
\ No newline at end of file
+    sys.exit(app.exec())
+ 
\ No newline at end of file
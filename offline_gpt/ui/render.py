@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List
+
+from PySide6.QtCore import QObject, Signal
+
+logger = logging.getLogger("offline-gpt")
+
+@lru_cache(maxsize=1024)
+def render_markdown(text):
+    """Convert markdown text to HTML for display"""
+    try:
+        import markdown
+        # Convert markdown to HTML
+        html = markdown.markdown(text, extensions=['fenced_code', 'codehilite', 'tables', 'nl2br'])
+
+        # Add some basic CSS styling for better appearance. Colors are
+        # translucent greys so the same HTML works in light and dark themes
+        # and cached renders stay valid across theme switches.
+        styled_html = f"""
+        <html>
+        <head>
+        <style>
+            body {{ 
+                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+                font-size: 14px;
+                line-height: 1.4;
+                margin: 0;
+                padding: 0;
+            }}
+            code {{ 
+                background-color: rgba(127, 127, 127, 20%); 
+                padding: 2px 4px; 
+                border-radius: 3px; 
+                font-family: 'Monaco', 'Menlo', 'Ubuntu Mono', monospace;
+                font-size: 13px;
+            }}
+            pre {{ 
+                background-color: rgba(127, 127, 127, 15%); 
+                padding: 8px; 
+                border-radius: 5px; 
+                overflow-x: auto;
+                border-left: 3px solid #0078d7;
+            }}
+            pre code {{ 
+                background-color: transparent; 
+                padding: 0;
+            }}
+            blockquote {{ 
+                border-left: 3px solid rgba(127, 127, 127, 50%); 
+                margin: 0; 
+                padding-left: 10px; 
+                color: rgba(127, 127, 127, 100%);
+            }}
+            ul, ol {{ 
+                margin: 8px 0; 
+                padding-left: 20px;
+            }}
+            li {{ 
+                margin: 2px 0;
+            }}
+            strong, b {{ 
+                font-weight: bold; 
+            }}
+            em, i {{ 
+                font-style: italic; 
+            }}
+            h1, h2, h3, h4, h5, h6 {{ 
+                margin: 8px 0 4px 0; 
+                font-weight: bold;
+            }}
+            h1 {{ font-size: 18px; }}
+            h2 {{ font-size: 16px; }}
+            h3 {{ font-size: 15px; }}
+            table {{ 
+                border-collapse: collapse; 
+                width: 100%; 
+                margin: 8px 0;
+            }}
+            th, td {{ 
+                border: 1px solid rgba(127, 127, 127, 40%); 
+                padding: 6px 8px; 
+                text-align: left;
+            }}
+            th {{ 
+                background-color: rgba(127, 127, 127, 15%); 
+                font-weight: bold;
+            }}
+        </style>
+        </head>
+        <body>
+        {html}
+        </body>
+        </html>
+        """
+        return styled_html
+    except Exception as e:
+        # Fallback to plain text if markdown rendering fails
+        logger.warning(f"Markdown rendering failed: {e}")
+        return f"<p>{text}</p>"
+
+class RenderPipeline(QObject):
+    """Converts message markdown to HTML on a thread pool.
+
+    ``start`` queues one render per message, newest first, tagged with a
+    generation number; ``rendered`` delivers results to the UI thread. Starting
+    a new generation (or calling ``cancel``) drops renders that have not begun
+    and makes in-flight ones discard their result.
+    """
+    rendered = Signal(int, int, str)  # generation, message index, html
+
+    def __init__(self, parent=None, max_workers=None):
+        super().__init__(parent)
+        self._max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="markdown")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._queue = []
+
+    def start(self, texts: List[str]) -> int:
+        """Render ``texts`` tail first; returns the generation tag used in ``rendered``"""
+        generation = self.cancel()
+        with self._lock:
+            # Popped from the end, so the newest message is rendered first
+            self._queue = [(index, text) for index, text in enumerate(texts)]
+        # A few workers drain the queue; submitting one task per message
+        # would cost the UI thread a thread-pool round trip each
+        for _ in range(min(self._max_workers, len(texts))):
+            self._executor.submit(self._drain, generation)
+        return generation
+
+    def cancel(self) -> int:
+        with self._lock:
+            self._generation += 1
+            self._queue = []
+            return self._generation
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _drain(self, generation: int):
+        while True:
+            with self._lock:
+                if generation != self._generation or not self._queue:
+                    return
+                index, text = self._queue.pop()
+            html = render_markdown(text)
+            if generation == self._generation:
+                self.rendered.emit(generation, index, html)
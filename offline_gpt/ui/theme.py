@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import Dict
+
+from PySide6.QtGui import QColor, QFont, QPalette
+from PySide6.QtWidgets import QApplication
+
+# Theme tokens. Standard roles go into the application QPalette; bubble colors
+# are read by the widgets' paint code, so nothing needs a per-widget stylesheet.
+THEMES: Dict[str, Dict[str, str]] = {
+    "light": {
+        "window": "#f7f7f7",
+        "base": "#ffffff",
+        "text": "#222222",
+        "button": "#eeeeee",
+        "button_text": "#222222",
+        "highlight": "#0078d7",
+        "highlighted_text": "#ffffff",
+        "muted": "#888888",
+        "user_name": "#0078d7",
+        "llm_name": "#444444",
+        "user_bubble": "#e1f5fe",
+        "llm_bubble": "#f1f1f1",
+        "danger": "#f44336",
+        "danger_text": "#ffffff",
+    },
+    "dark": {
+        "window": "#232629",
+        "base": "#2b2b2b",
+        "text": "#f0f0f0",
+        "button": "#444444",
+        "button_text": "#ffffff",
+        "highlight": "#3a8ee6",
+        "highlighted_text": "#ffffff",
+        "muted": "#9a9a9a",
+        "user_name": "#4fa3ff",
+        "llm_name": "#cfcfcf",
+        "user_bubble": "#1e3a4c",
+        "llm_bubble": "#33363a",
+        "danger": "#d9534f",
+        "danger_text": "#ffffff",
+    },
+}
+
+_current = "light"
+
+def current_theme() -> Dict[str, str]:
+    return THEMES[_current]
+
+def color(token: str) -> QColor:
+    return _color(_current, token)
+
+@lru_cache(maxsize=None)
+def _color(theme: str, token: str) -> QColor:
+    return QColor(THEMES[theme][token])
+
+@lru_cache(maxsize=None)
+def build_palette(theme: str) -> QPalette:
+    tokens = THEMES[theme]
+    palette = QPalette()
+    roles = {
+        QPalette.ColorRole.Window: "window",
+        QPalette.ColorRole.WindowText: "text",
+        QPalette.ColorRole.Base: "base",
+        QPalette.ColorRole.AlternateBase: "window",
+        QPalette.ColorRole.Text: "text",
+        QPalette.ColorRole.Button: "button",
+        QPalette.ColorRole.ButtonText: "button_text",
+        QPalette.ColorRole.Highlight: "highlight",
+        QPalette.ColorRole.HighlightedText: "highlighted_text",
+        QPalette.ColorRole.ToolTipBase: "base",
+        QPalette.ColorRole.ToolTipText: "text",
+        QPalette.ColorRole.PlaceholderText: "muted",
+        # Sender names: the user's in Link, the model's in BrightText
+        QPalette.ColorRole.Link: "user_name",
+        QPalette.ColorRole.BrightText: "llm_name",
+    }
+    for role, token in roles.items():
+        palette.setColor(role, QColor(tokens[token]))
+    return palette
+
+def apply_theme(theme: str, app=None):
+    """Switch the whole application to ``theme`` with a single palette change"""
+    global _current
+    _current = theme
+    app = app or QApplication.instance()
+    app.setPalette(build_palette(theme))
+
+@lru_cache(maxsize=None)
+def font(kind: str) -> QFont:
+    """Shared fonts for chat chrome: "sender", "message", "timestamp", "dots", "label", "small" """
+    sizes = {"sender": None, "message": 14, "timestamp": 10, "dots": 16, "label": 12, "small": 11}
+    f = QFont(QApplication.font())
+    if sizes[kind]:
+        f.setPixelSize(sizes[kind])
+    if kind in ("sender", "label"):
+        f.setBold(True)
+    return f
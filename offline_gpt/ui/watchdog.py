@@ -0,0 +1,70 @@
+import logging
+from collections import Counter
+
+from PySide6.QtCore import QObject, QTimer, Signal
+from PySide6.QtWidgets import QApplication
+
+from offline_gpt.diagnostics import HeapTracker, MetricsLog, current_rss_bytes
+
+logger = logging.getLogger("offline-gpt")
+
+MB = 1024 * 1024
+
+class MemoryWatchdog(QObject):
+    """Periodically samples RSS, the Python heap and live widget counts.
+
+    Each sample is written to the metrics log. When RSS has grown more than
+    ``growth_warning_mb`` above the first sample a warning is logged and
+    ``growth_warning`` emitted, again for every further step of that size.
+    """
+    growth_warning = Signal(str)
+
+    def __init__(self, metrics: MetricsLog, interval_seconds: int = 60, growth_warning_mb: int = 200, parent=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.growth_warning_mb = growth_warning_mb
+        self.heap = HeapTracker()
+        self._baseline_rss = current_rss_bytes()
+        self._warned_steps = 0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.sample)
+        self.timer.start(interval_seconds * 1000)
+        logger.info(f"Memory diagnostics enabled, writing to {metrics.path}")
+
+    def reset_baseline(self):
+        """Measure growth from the current RSS, e.g. once the model has been loaded or released"""
+        self._baseline_rss = current_rss_bytes()
+        self._warned_steps = 0
+
+    def widget_counts(self, limit: int = 15):
+        counts = Counter(type(widget).__name__ for widget in QApplication.allWidgets())
+        return dict(counts.most_common(limit))
+
+    def sample(self):
+        rss = current_rss_bytes()
+        widgets = self.widget_counts()
+        self.metrics.write(
+            "memory",
+            rss_mb=rss / MB if rss is not None else None,
+            python_heap=self.heap.traced_bytes(),
+            top_allocators=self.heap.top_allocators(5),
+            widgets=widgets,
+            widgets_total=len(QApplication.allWidgets()),
+        )
+        if rss is None or self._baseline_rss is None:
+            return
+        growth_mb = (rss - self._baseline_rss) / MB
+        steps = int(growth_mb // self.growth_warning_mb)
+        if steps > self._warned_steps:
+            self._warned_steps = steps
+            message = f"Memory grew {growth_mb:.0f} MB since start (RSS {rss / MB:.0f} MB)"
+            logger.warning(message)
+            self.metrics.write("memory_warning", growth_mb=growth_mb, rss_mb=rss / MB, widgets=widgets)
+            self.growth_warning.emit(message)
+
+    def heap_snapshot_diff(self, limit: int = 15) -> str:
+        """Compare the Python heap with the previous diff and return a readable summary"""
+        diff = self.heap.diff(limit)
+        self.metrics.write("heap_diff", top=diff)
+        lines = [f"{entry['size_diff'] / 1024:+.1f} KiB ({entry['count_diff']:+d} blocks)  {entry['where']}" for entry in diff]
+        return "\n".join(lines) or "No Python heap changes since the last snapshot."